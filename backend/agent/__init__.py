@@ -1,6 +1,20 @@
 """Suna Lite Agent Package"""
 
-from .loop import AgentLoop
-from .memory import Memory
+from .loop import AgentLoop, speculation_stats
+from .memory import ConversationCache, Memory, conversation_cache
+from .persistence import RunUnitOfWork
+from .summary import ConversationSummarizer, get_summarizer
+from .tool_output import ToolResultStore, tool_results
 
-__all__ = ["AgentLoop", "Memory"]
\ No newline at end of file
+__all__ = [
+    "AgentLoop",
+    "ConversationCache",
+    "ConversationSummarizer",
+    "Memory",
+    "RunUnitOfWork",
+    "ToolResultStore",
+    "conversation_cache",
+    "get_summarizer",
+    "speculation_stats",
+    "tool_results"
+]
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""Token-budgeted context building for model prompts"""
+
+from typing import Any, Dict, List
+
+from backend.tokens import count_tokens
+
+# Fixed per-message cost of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Prompt cost of a history message, using its stored count when present"""
+    token_count = message.get("token_count")
+    if token_count is None:
+        token_count = count_tokens(message.get("content"))
+    return token_count + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_context(history: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+    """Select the newest messages that fit within ``token_budget``
+
+    ``history`` is oldest first. The newest message is always kept, even when
+    it alone exceeds the budget. Returns OpenAI-format messages, oldest first.
+    """
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if selected and used + cost > token_budget:
+            break
+        selected.append({"role": message["role"], "content": message["content"]})
+        used += cost
+
+    selected.reverse()
+    return selected
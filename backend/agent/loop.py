@@ -1,154 +1,365 @@
 """Agent Loop Implementation with OpenAI Integration and Tool Execution"""
 
+import asyncio
 import json
 import logging
+import time
 import uuid
 from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
-from datetime import datetime
 
-import httpx
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 
 from backend.config import get_settings
-from backend.db import get_db
-from backend.db.models import Thread, Message, Run
-from backend.agent.tools import get_default_tools, ToolCall, ToolResult
+from backend.deadline import Deadline, RunTimeout
+from backend.tokens import count_tokens
+from backend.http_clients import http_clients
+from backend.llm_cache import LLMResponseCache, get_llm_cache
+from backend.db import AsyncSessionLocal
+from backend.db.models import Thread, Message
+from backend.agent.context import build_context, message_tokens
+from backend.agent.memory import conversation_cache
+from backend.agent.persistence import RunUnitOfWork
+from backend.agent.summary import SUMMARY_HEADER
+from backend.agent.tool_output import reduce_tool_output, tool_results
+from backend.agent.tools import get_tool_registry, BaseTool, ToolCall, ToolRegistry, ToolResult
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = "You are a helpful agent. Use tools when needed. Stop when done."
 
-class AgentLoop:
-    """Main agent loop for handling conversations and tool execution"""
+OPENAI_MODEL = "gpt-3.5-turbo"
+
+# Agent events are plain dicts with a ``type`` key: ``token``, ``tool_call``,
+# ``tool_result`` and a final ``message`` carrying the full response and the
+# run's summed token ``usage``. A run cut off by its deadline ends with a
+# ``message`` flagged ``timed_out`` holding whatever text was produced.
+AgentEvent = Dict[str, Any]
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+# Final content of a timed out run that produced no text of its own
+TIMEOUT_MESSAGE = "The run timed out before a final answer was ready."
+
+# Phrases suggesting a message needs a web search
+SEARCH_KEYWORDS = ["search", "find", "what is", "who is", "when", "where"]
+
+
+def looks_like_search(text: Any) -> bool:
+    """Simple heuristic to decide if a message calls for web search"""
+    return isinstance(text, str) and any(keyword in text.lower() for keyword in SEARCH_KEYWORDS)
+
+
+def add_usage(total: Dict[str, int], usage: Optional[Dict[str, Any]]) -> None:
+    """Accumulate a model response's ``usage`` block into a running total"""
+    if not usage:
+        return
+    for field in USAGE_FIELDS:
+        total[field] += usage.get(field) or 0
+
+class SpeculationStats:
+    """Counters for speculative search prefetches"""
     
     def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.wasted = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and number of prefetches that went unused"""
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "hit_rate": self.hits / self.started if self.started else 0.0
+        }
+
+
+# Global speculation counters
+speculation_stats = SpeculationStats()
+
+
+class SpeculativeSearch:
+    """A web search on the raw user message, started before the model asks for it"""
+    
+    def __init__(self, query: str, task: "asyncio.Task[ToolResult]"):
+        self.query = query
+        self.task = task
+        self.claimed = False
+    
+    def claim(self, tool_calls: List[Dict[str, Any]]) -> Dict[int, "asyncio.Task[ToolResult]"]:
+        """Hand the prefetch over to the first tool call asking for the same search"""
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call["function"]["name"] != "web_search":
+                continue
+            try:
+                arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+            except json.JSONDecodeError:
+                continue
+            query = arguments.get("query")
+            if (
+                isinstance(query, str)
+                and " ".join(query.lower().split()) == " ".join(self.query.lower().split())
+                and arguments.get("top_k", 5) == 5
+            ):
+                self.claimed = True
+                speculation_stats.hits += 1
+                return {index: self.task}
+        return {}
+    
+    def discard(self) -> None:
+        """Cancel the prefetch unless a tool call claimed it"""
+        if not self.claimed:
+            self.task.cancel()
+            # Nobody awaits an unclaimed prefetch; retrieve its error so it isn't reported as unhandled
+            self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            speculation_stats.wasted += 1
+
+
+class AgentLoop:
+    """Main agent loop for handling conversations and tool execution
+    
+    Instances are cheap per-run views over the shared tool registry. Each one
+    carries the run's deadline, which defaults to ``TIMEOUT_SECONDS`` from now.
+    """
+    
+    def __init__(self, registry: Optional[ToolRegistry] = None, deadline: Optional[Deadline] = None):
         self.settings = get_settings()
-        self.tools = get_default_tools()
-        self.tool_schemas = self._build_tool_schemas()
+        self.registry = registry or get_tool_registry()
+        self.deadline = deadline or Deadline(self.settings.TIMEOUT_SECONDS)
         self.max_iterations = 2  # MVP limit
     
-    def _build_tool_schemas(self) -> List[Dict[str, Any]]:
-        """Build OpenAI-compatible tool schemas"""
-        schemas = []
-        for tool in self.tools:
-            schemas.append(tool.schema)
-        return schemas
+    def _chat_completions_url(self) -> str:
+        """Chat Completions endpoint under the configured base URL"""
+        return f"{self.settings.OPENAI_BASE_URL.rstrip('/')}/chat/completions"
     
-    async def run_agent(self, thread_id: uuid.UUID, last_user_message: str) -> Tuple[str, AsyncIterator[str]]:
-        """Main agent execution function"""
+    def _build_request_body(self, messages: List[Dict[str, Any]], stream: bool = False) -> bytes:
+        """Serialize a chat completions request, splicing in the pre-serialized tools"""
+        payload = {
+            "model": OPENAI_MODEL,
+            "messages": messages,
+            "tool_choice": "auto"
+        }
+        if stream:
+            payload["stream"] = True
+            # Ask for a final chunk carrying the usage block
+            payload["stream_options"] = {"include_usage": True}
+        
+        body = json.dumps(payload)
+        return f'{body[:-1]}, "tools": {self.registry.schemas_json}}}'.encode()
+    
+    async def run_agent(
+        self,
+        thread_id: uuid.UUID,
+        last_user_message: str,
+        use_cache: bool = True
+    ) -> AsyncIterator[AgentEvent]:
+        """Main agent execution function
+        
+        Yields each event the moment it happens. The last event is always a
+        ``message`` event holding the final response; persisting it is up to
+        the caller's ``RunUnitOfWork``. ``use_cache=False`` bypasses the LLM
+        response cache for this run.
+        """
         logger.info(f"Starting agent run for thread {thread_id}")
         
         # Load conversation history
-        messages = self._load_conversation_history(thread_id)
+        messages = await self._load_conversation_history(thread_id)
+        
+        # Add the new user message unless it was already persisted to history
+        if messages[-1] != {"role": "user", "content": last_user_message}:
+            messages.append({
+                "role": "user",
+                "content": last_user_message
+            })
         
-        # Add the new user message
-        messages.append({
-            "role": "user",
-            "content": last_user_message
-        })
+        # Execute agent loop with tool calls, forwarding events as they occur
+        async for event in self._execute_agent_loop(messages, use_cache):
+            yield event
+    
+    async def _load_conversation_history(self, thread_id: uuid.UUID) -> List[Dict[str, Any]]:
+        """Load the thread summary plus as much recent history as fits the context token budget
         
-        # Execute agent loop with tool calls
-        final_response, events = await self._execute_agent_loop(messages)
+        History comes from the conversation cache when possible; token counts
+        are the ones stored with each message, so nothing is re-tokenized.
+        Messages already folded into the summary are not sent again.
+        """
+        history = conversation_cache.get(thread_id)
+        if history is None:
+            history, summary = await self._query_conversation_history(thread_id)
+        else:
+            summary = conversation_cache.get_summary(thread_id)
         
-        # Save final assistant message to DB
-        self._save_assistant_message(thread_id, final_response)
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        token_budget = self.settings.CONTEXT_TOKEN_BUDGET
+        if summary:
+            summary_message = {"role": "system", "content": f"{SUMMARY_HEADER}{summary}"}
+            token_budget -= message_tokens(summary_message)
+            messages.append(summary_message)
         
-        return final_response, events
+        return messages + build_context(history, token_budget)
     
-    def _load_conversation_history(self, thread_id: uuid.UUID) -> List[Dict[str, Any]]:
-        """Load last ~20 messages from database"""
-        db = next(get_db())
+    async def _query_conversation_history(self, thread_id: uuid.UUID) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Read the summary and unsummarized recent messages from the database and populate the cache"""
+        conversation_cache.begin_load(thread_id)
+        history: Optional[List[Dict[str, Any]]] = None
+        summary: Optional[str] = None
         try:
-            messages = db.query(Message).filter(
-                Message.thread_id == thread_id
-            ).order_by(Message.created_at.desc()).limit(20).all()
+            async with AsyncSessionLocal() as db:
+                thread = (await db.execute(
+                    select(Thread.summary, Thread.summarized_until).where(Thread.id == thread_id)
+                )).first()
+                query = select(Message.role, Message.content, Message.token_count).where(
+                    Message.thread_id == thread_id
+                )
+                if thread is not None:
+                    summary = thread.summary
+                    if thread.summarized_until is not None:
+                        query = query.where(Message.created_at > thread.summarized_until)
+                messages = (await db.execute(
+                    query.order_by(Message.created_at.desc()).limit(conversation_cache.max_messages)
+                )).all()
             
-            # Convert to OpenAI format and reverse to chronological order
-            openai_messages = [{
-                "role": "system",
-                "content": SYSTEM_PROMPT
-            }]
-            
-            for msg in reversed(messages):
-                openai_messages.append({
+            # Convert to OpenAI format and reverse to chronological order.
+            # Startup backfills missing counts; only rows written outside the API lack one.
+            history = [
+                {
                     "role": msg.role,
-                    "content": msg.content
-                })
-            
-            return openai_messages
+                    "content": msg.content,
+                    "token_count": msg.token_count if msg.token_count is not None else count_tokens(msg.content)
+                }
+                for msg in reversed(messages)
+            ]
+            return history, summary
         finally:
-            db.close()
+            conversation_cache.finish_load(thread_id, history, summary)
     
-    def _save_assistant_message(self, thread_id: uuid.UUID, content: str) -> None:
-        """Save assistant message to database"""
-        db = next(get_db())
-        try:
-            message = Message(
-                id=uuid.uuid4(),
-                thread_id=thread_id,
-                role="assistant",
-                content=content,
-                created_at=datetime.utcnow()
-            )
-            db.add(message)
-            db.commit()
-            logger.info(f"Saved assistant message for thread {thread_id}")
-        except Exception as e:
-            logger.error(f"Failed to save assistant message: {e}")
-            db.rollback()
-        finally:
-            db.close()
-    
-    async def _execute_agent_loop(self, messages: List[Dict[str, Any]]) -> Tuple[str, AsyncIterator[str]]:
-        """Execute the main agent loop with tool calls"""
+    async def _execute_agent_loop(self, messages: List[Dict[str, Any]], use_cache: bool = True) -> AsyncIterator[AgentEvent]:
+        """Execute the main agent loop with tool calls, yielding events live"""
         current_messages = messages.copy()
+        # The question tool output gets excerpted against
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
         iteration = 0
-        events = []
+        usage = {field: 0 for field in USAGE_FIELDS}
+        # Text streamed in the current iteration, kept as the partial result on timeout
+        partial: List[str] = []
         
-        while iteration < self.max_iterations:
-            iteration += 1
-            logger.info(f"Agent iteration {iteration}")
-            
-            # Get model response
-            if self.settings.OPENAI_API_KEY:
-                response = await self._call_openai_api(current_messages)
-            else:
-                response = self._simulate_openai_response(current_messages)
-            
-            # Check if model wants to use tools
-            tool_calls = response.get("tool_calls", [])
-            
-            if not tool_calls:
-                # No tools requested, return final response
-                final_content = response.get("content", "I'm ready to help!")
-                events.append({"type": "message", "content": final_content})
-                return final_content, self._create_event_stream(events)
-            
-            # Add assistant message with tool calls
-            current_messages.append({
-                "role": "assistant",
-                "content": response.get("content", ""),
-                "tool_calls": tool_calls
-            })
-            
-            # Execute tool calls
-            for tool_call in tool_calls:
-                events.append({"type": "tool_call", "tool_call": tool_call})
+        try:
+            while iteration < self.max_iterations:
+                iteration += 1
+                logger.info(f"Agent iteration {iteration}")
+                partial = []
+                
+                # Optionally run the likely search alongside the first model call
+                speculation = self._start_speculative_search(current_messages) if iteration == 1 else None
+                try:
+                    # Get model response, forwarding streamed tokens
+                    response = None
+                    async for chunk in self._get_model_response(current_messages, use_cache):
+                        if chunk["type"] == "token":
+                            partial.append(chunk["content"])
+                            yield chunk
+                        else:
+                            response = chunk
+                    
+                    # Check if model wants to use tools
+                    tool_calls = response.get("tool_calls", [])
+                    prefetched = speculation.claim(tool_calls) if speculation else {}
+                finally:
+                    if speculation is not None:
+                        speculation.discard()
                 
-                tool_result = await self._execute_tool_call(tool_call)
-                events.append({"type": "tool_result", "result": tool_result.model_dump()})
+                streamed = response.get("streamed", False)
+                add_usage(usage, response.get("usage"))
                 
-                # Add tool result as message
+                if not tool_calls:
+                    # No tools requested, return final response
+                    final_content = response.get("content") or "I'm ready to help!"
+                    yield {"type": "message", "content": final_content, "streamed": streamed, "usage": usage}
+                    return
+                
+                # Add assistant message with tool calls
                 current_messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.get("id", str(uuid.uuid4())),
-                    "content": json.dumps(tool_result.data) if hasattr(tool_result, 'data') else str(tool_result)
+                    "role": "assistant",
+                    "content": response.get("content", ""),
+                    "tool_calls": tool_calls
                 })
+                
+                # Give every call an id up front so results can be correlated
+                for tool_call in tool_calls:
+                    if not tool_call.get("id"):
+                        tool_call["id"] = str(uuid.uuid4())
+                    yield {"type": "tool_call", "tool_call": tool_call}
+                
+                # Execute tool calls concurrently, reporting each as it finishes
+                results: List[Optional[ToolResult]] = [None] * len(tool_calls)
+                async for index, tool_result in self._execute_tool_calls(tool_calls, prefetched):
+                    results[index] = tool_result
+                    yield {
+                        "type": "tool_result",
+                        "tool_call_id": tool_calls[index]["id"],
+                        "result": tool_result.model_dump()
+                    }
+                
+                # Add tool results as messages in the order the model requested them
+                for tool_call, tool_result in zip(tool_calls, results):
+                    current_messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call["id"],
+                        "content": self._tool_message_content(tool_call, tool_result, question)
+                    })
+        except RunTimeout as e:
+            logger.warning(f"Agent loop stopped: {e}")
+            yield {
+                "type": "message",
+                "content": "".join(partial) or TIMEOUT_MESSAGE,
+                "streamed": bool(partial),
+                "usage": usage,
+                "timed_out": True
+            }
+            return
         
         # If we've reached max iterations, return last response
         final_content = "I've completed the available iterations."
-        events.append({"type": "message", "content": final_content})
-        return final_content, self._create_event_stream(events)
+        yield {"type": "message", "content": final_content, "streamed": False, "usage": usage}
+    
+    async def _get_model_response(self, messages: List[Dict[str, Any]], use_cache: bool = True) -> AsyncIterator[AgentEvent]:
+        """Get the next model response from the cache, a streaming call or a plain call
+        
+        Yields any ``token`` events followed by one ``response`` event whose
+        ``streamed`` flag says whether its content was already sent as tokens.
+        """
+        if not self.settings.OPENAI_API_KEY:
+            yield {"type": "response", "streamed": False, **self._simulate_openai_response(messages)}
+            return
+        
+        stream = self.settings.OPENAI_STREAMING
+        cache: Optional[LLMResponseCache] = get_llm_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(OPENAI_MODEL, messages, self.registry.schemas_json)
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving model response from LLM cache")
+                if stream and cached["content"]:
+                    yield {"type": "token", "content": cached["content"]}
+                yield {"type": "response", "streamed": stream, "cached": True, **cached}
+                return
+        
+        started = time.monotonic()
+        if stream:
+            response = None
+            async for chunk in self._stream_openai_api(messages):
+                if chunk["type"] == "token":
+                    yield chunk
+                else:
+                    response = chunk
+        else:
+            response = {"type": "response", **(await self._call_openai_api(messages))}
+        response["streamed"] = stream
+        
+        if cache is not None:
+            await cache.put(cache_key, response, time.monotonic() - started)
+        yield response
     
     async def _call_openai_api(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Call OpenAI Chat Completions API"""
@@ -157,34 +368,110 @@ class AgentLoop:
             "Content-Type": "application/json"
         }
         
-        payload = {
-            "model": "gpt-3.5-turbo",
-            "messages": messages,
-            "tools": self.tool_schemas,
-            "tool_choice": "auto"
+        logger.info("Calling OpenAI API")
+        
+        client = http_clients.get("openai")
+        response = await self.deadline.run(client.post(
+            self._chat_completions_url(),
+            headers=headers,
+            content=self._build_request_body(messages)
+        ))
+        
+        if response.status_code != 200:
+            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+            raise Exception(f"OpenAI API failed: {response.status_code}")
+        
+        data = response.json()
+        choice = data["choices"][0]
+        message = choice["message"]
+        
+        return {
+            "content": message.get("content", ""),
+            "tool_calls": message.get("tool_calls", []),
+            "usage": data.get("usage")
         }
+    
+    async def _stream_openai_api(self, messages: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Call OpenAI Chat Completions API with ``stream=true``
         
-        logger.info("Calling OpenAI API")
+        Yields ``{"type": "token", "content": delta}`` for every content delta
+        as it arrives, followed by a single ``{"type": "response", ...}`` with
+        the assembled content, tool calls and usage.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
+        logger.info("Calling OpenAI API (streaming)")
+        
+        content_parts: List[str] = []
+        # Tool call fragments arrive keyed by index and must be stitched together
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        
+        client = http_clients.get("openai")
+        request = client.build_request(
+            "POST",
+            self._chat_completions_url(),
+            headers=headers,
+            content=self._build_request_body(messages, stream=True)
+        )
+        # Sending waits for the response headers, so it must be under the deadline too
+        response = await self.deadline.run(client.send(request, stream=True))
+        try:
             if response.status_code != 200:
-                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                body = await self.deadline.run(response.aread())
+                logger.error(f"OpenAI API error: {response.status_code} - {body.decode(errors='replace')}")
                 raise Exception(f"OpenAI API failed: {response.status_code}")
             
-            data = response.json()
-            choice = data["choices"][0]
-            message = choice["message"]
-            
-            return {
-                "content": message.get("content", ""),
-                "tool_calls": message.get("tool_calls", [])
-            }
+            lines = response.aiter_lines()
+            while True:
+                # Bound each read rather than the whole stream, so the
+                # timeout never spans a yield back to the consumer
+                try:
+                    line = await self.deadline.run(anext(lines))
+                except StopAsyncIteration:
+                    break
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                if not chunk.get("choices"):
+                    continue
+                delta = chunk["choices"][0].get("delta") or {}
+                
+                if delta.get("content"):
+                    content_parts.append(delta["content"])
+                    yield {"type": "token", "content": delta["content"]}
+                
+                for fragment in delta.get("tool_calls") or []:
+                    call = tool_calls.setdefault(fragment.get("index", 0), {
+                        "id": "",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if fragment.get("id"):
+                        call["id"] = fragment["id"]
+                    function = fragment.get("function") or {}
+                    if function.get("name"):
+                        call["function"]["name"] += function["name"]
+                    if function.get("arguments"):
+                        call["function"]["arguments"] += function["arguments"]
+        finally:
+            await response.aclose()
+        
+        yield {
+            "type": "response",
+            "content": "".join(content_parts),
+            "tool_calls": [tool_calls[index] for index in sorted(tool_calls)],
+            "usage": usage
+        }
     
     def _simulate_openai_response(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Simulate OpenAI response when API key is not available"""
@@ -194,7 +481,7 @@ class AgentLoop:
         user_content = last_message.get("content", "")
         
         # Simple heuristic to decide if we should use web search
-        if any(keyword in user_content.lower() for keyword in ["search", "find", "what is", "who is", "when", "where"]):
+        if looks_like_search(user_content):
             return {
                 "content": f"I will search for information about: {user_content}",
                 "tool_calls": [{
@@ -212,19 +499,65 @@ class AgentLoop:
             "tool_calls": []
         }
     
+    def _start_speculative_search(self, messages: List[Dict[str, Any]]) -> Optional[SpeculativeSearch]:
+        """Start a web search for the raw user message if speculation is enabled and it looks needed"""
+        if not self.settings.SPECULATIVE_SEARCH_ENABLED or "web_search" not in self.registry:
+            return None
+        
+        last_message = messages[-1] if messages else {}
+        query = last_message.get("content")
+        if last_message.get("role") != "user" or not looks_like_search(query):
+            return None
+        
+        logger.info(f"Starting speculative web search for: {query}")
+        speculation_stats.started += 1
+        task = asyncio.create_task(self._execute_tool_call({
+            "id": "speculative",
+            "function": {"name": "web_search", "arguments": json.dumps({"query": query})}
+        }))
+        return SpeculativeSearch(query, task)
+    
+    async def _execute_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        prefetched: Optional[Dict[int, "asyncio.Task[ToolResult]"]] = None
+    ) -> AsyncIterator[Tuple[int, ToolResult]]:
+        """Run tool calls concurrently, yielding ``(index, result)`` in completion order
+        
+        Calls listed in ``prefetched`` reuse an already running task instead.
+        """
+        prefetched = prefetched or {}
+        
+        async def run(index: int, tool_call: Dict[str, Any]) -> Tuple[int, ToolResult]:
+            if index in prefetched:
+                return index, await prefetched[index]
+            return index, await self._execute_tool_call(tool_call)
+        
+        tasks = [asyncio.create_task(run(index, tool_call)) for index, tool_call in enumerate(tool_calls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Don't leave calls running if the consumer stops early
+            for task in tasks:
+                task.cancel()
+    
     async def _execute_tool_call(self, tool_call: Dict[str, Any]) -> ToolResult:
-        """Execute a single tool call"""
+        """Execute a single tool call, respecting the tool's concurrency cap"""
         function_name = tool_call["function"]["name"]
-        arguments = json.loads(tool_call["function"]["arguments"])
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid arguments for tool {function_name}: {e}")
+            return ToolResult(
+                name=function_name,
+                ok=False,
+                data={"error": f"Invalid JSON arguments: {e}"}
+            )
         
         logger.info(f"Executing tool: {function_name} with args: {arguments}")
         
-        # Find the tool
-        tool = None
-        for t in self.tools:
-            if t.name == function_name:
-                tool = t
-                break
+        tool = self.registry.get(function_name)
         
         if not tool:
             logger.error(f"Tool not found: {function_name}")
@@ -235,9 +568,11 @@ class AgentLoop:
             )
         
         try:
-            result = await tool(**arguments)
+            result = await self.deadline.run(self._invoke_tool(tool, arguments))
             logger.info(f"Tool {function_name} executed successfully")
             return result
+        except RunTimeout:
+            raise
         except Exception as e:
             logger.error(f"Tool {function_name} execution failed: {e}")
             return ToolResult(
@@ -246,80 +581,68 @@ class AgentLoop:
                 data={"error": str(e), "raw_exception": str(e)}
             )
     
-    async def _create_event_stream(self, events: List[Dict[str, Any]]) -> AsyncIterator[str]:
-        """Create async stream iterator for events"""
-        for event in events:
-            yield json.dumps(event)
-        yield json.dumps({"type": "done"})
-
+    def _tool_message_content(self, tool_call: Dict[str, Any], tool_result: ToolResult, question: Any) -> str:
+        """Reduce a tool result to its prompt form, keeping the full result in the result store"""
+        tool = self.registry.get(tool_call["function"]["name"])
+        max_tokens = tool.max_result_tokens if tool else BaseTool.max_result_tokens
+        
+        # Excerpt against both the user's question and the call's own arguments
+        query = question if isinstance(question, str) else ""
+        try:
+            arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+            query = " ".join([query] + [value for value in arguments.values() if isinstance(value, str)])
+        except (json.JSONDecodeError, AttributeError):
+            pass
+        
+        tool_results.put(tool_call["id"], tool_result.model_dump())
+        content = reduce_tool_output(tool_result.data, max_tokens, query, result_id=tool_call["id"])
+        tool_results.record(count_tokens(tool_result.data), count_tokens(content))
+        return content
+    
+    async def _invoke_tool(self, tool: BaseTool, arguments: Dict[str, Any]) -> ToolResult:
+        """Call a tool once a slot under its concurrency cap is free"""
+        async with tool.semaphore:
+            return await tool(**arguments)
+    
 
 async def start_run(run_id: uuid.UUID) -> AsyncIterator[str]:
     """Start a run and yield events"""
     logger.info(f"Starting run {run_id}")
     
-    # Update run status to running
-    _update_run_status(run_id, "running")
-    
-    try:
-        # Get run details
-        db = next(get_db())
+    async with RunUnitOfWork(run_id) as unit_of_work:
         try:
-            run = db.query(Run).filter(Run.id == run_id).first()
-            if not run:
-                raise Exception(f"Run {run_id} not found")
-            
+            # Find the message the run answers, then mark it running in the same transaction
+            last_message = await unit_of_work.latest_user_message()
+            run = await unit_of_work.start()
             thread_id = run.thread_id
             
-            # Get the last user message
-            last_message = db.query(Message).filter(
-                Message.thread_id == thread_id,
-                Message.role == "user"
-            ).order_by(Message.created_at.desc()).first()
-            
             if not last_message:
                 raise Exception(f"No user message found for thread {thread_id}")
             
             user_content = last_message.content
-        finally:
-            db.close()
-        
-        # Initialize agent loop
-        agent = AgentLoop()
-        
-        # Run agent
-        final_response, event_stream = await agent.run_agent(thread_id, user_content)
-        
-        # Yield events
-        async for event in event_stream:
-            yield event
-        
-        # Update run status to completed
-        _update_run_status(run_id, "completed", tokens_used=100)  # Mock token count
-        
-        yield json.dumps({"type": "run_completed", "final_response": final_response})
-        
-    except Exception as e:
-        logger.error(f"Run {run_id} failed: {e}")
-        _update_run_status(run_id, "error", error_message=str(e))
-        yield json.dumps({"type": "error", "message": str(e)})
-
-
-def _update_run_status(run_id: uuid.UUID, status: str, tokens_used: Optional[int] = None, error_message: Optional[str] = None) -> None:
-    """Update run status in database"""
-    db = next(get_db())
-    try:
-        run = db.query(Run).filter(Run.id == run_id).first()
-        if run:
-            run.status = status
-            if tokens_used is not None:
-                run.tokens_used = tokens_used
-            if error_message:
-                run.error_message = error_message
-            run.updated_at = datetime.utcnow()
-            db.commit()
-            logger.info(f"Updated run {run_id} status to {status}")
-    except Exception as e:
-        logger.error(f"Failed to update run status: {e}")
-        db.rollback()
-    finally:
-        db.close()
\ No newline at end of file
+            
+            # Initialize agent loop
+            agent = AgentLoop()
+            
+            # Run agent, forwarding each event as soon as it is produced
+            final_response = None
+            usage = None
+            status = "completed"
+            async for event in agent.run_agent(thread_id, user_content):
+                if event["type"] == "message":
+                    final_response = event["content"]
+                    usage = event["usage"]
+                    if event.get("timed_out"):
+                        status = "timeout"
+                yield json.dumps(event)
+            yield json.dumps({"type": "done"})
+            
+            # Record the answer and the run outcome together, or timeout if the deadline cut it short
+            await unit_of_work.finish(status, result=final_response, usage=usage, assistant_content=final_response)
+            
+            yield json.dumps({"type": "run_completed", "status": status, "final_response": final_response})
+            
+        except Exception as e:
+            logger.error(f"Run {run_id} failed: {e}")
+            await unit_of_work.fail(str(e))
+            yield json.dumps({"type": "error", "message": str(e)})
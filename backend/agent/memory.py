@@ -1,6 +1,8 @@
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set
 from datetime import datetime
 import json
+import uuid
 
 class Memory:
     """Simple in-memory storage for agent conversations and context"""
@@ -9,6 +11,8 @@ class Memory:
         self.messages: List[Dict[str, Any]] = []
         self.max_messages = max_messages
         self.session_id: Optional[str] = None
+        # Rolling summary of older messages no longer kept verbatim
+        self.summary: Optional[str] = None
     
     def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
         """Add a message to memory"""
@@ -63,7 +67,8 @@ class Memory:
         return {
             "messages": self.messages,
             "session_id": self.session_id,
-            "max_messages": self.max_messages
+            "max_messages": self.max_messages,
+            "summary": self.summary
         }
     
     @classmethod
@@ -72,6 +77,7 @@ class Memory:
         memory = cls(max_messages=data.get("max_messages", 100))
         memory.messages = data.get("messages", [])
         memory.session_id = data.get("session_id")
+        memory.summary = data.get("summary")
         return memory
     
     def get_summary(self) -> Dict[str, Any]:
@@ -87,4 +93,139 @@ class Memory:
             "session_id": self.session_id,
             "oldest_message": self.messages[0]["timestamp"] if self.messages else None,
             "newest_message": self.messages[-1]["timestamp"] if self.messages else None
-        }
\ No newline at end of file
+        }
+
+class ConversationCache:
+    """Bounded LRU of per-thread conversation history in OpenAI message format
+    
+    Each cached thread is a ``Memory`` holding the most recent messages. The
+    cache is appended to whenever a message is written, so repeated runs on a
+    thread can skip the history query. Loads are tracked so that a write
+    landing while a load is in flight discards the (possibly stale) result.
+    Messages already folded into the thread's rolling summary are not cached;
+    the summary itself is kept alongside the recent messages.
+    
+    Only writes made in this process reach the cache, so it must be disabled
+    when several API processes share the database; ``get`` then always misses.
+    """
+    
+    @staticmethod
+    def _key(thread_id: Any) -> str:
+        """Canonical form of a thread id, whether given as a UUID or any spelling of one"""
+        try:
+            return str(uuid.UUID(str(thread_id)))
+        except ValueError:
+            return str(thread_id)
+    
+    def __init__(self, max_threads: int = 1000, max_messages: int = 100, enabled: bool = True):
+        self.max_threads = max_threads
+        self.max_messages = max_messages
+        self.enabled = enabled
+        self._threads: "OrderedDict[str, Memory]" = OrderedDict()
+        # In-flight load counts and threads written to while a load was running
+        self._loading: Dict[str, int] = {}
+        self._stale: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.invalidations = 0
+        self.evictions = 0
+    
+    def get(self, thread_id: Any) -> Optional[List[Dict[str, Any]]]:
+        """Get cached history for a thread, oldest first, or None on a miss
+        
+        Messages carry their stored ``token_count`` alongside role and content.
+        """
+        key = self._key(thread_id)
+        memory = self._threads.get(key) if self.enabled else None
+        if memory is None:
+            self.misses += 1
+            return None
+        self._threads.move_to_end(key)
+        self.hits += 1
+        return [
+            {"role": msg["role"], "content": msg["content"], "token_count": msg["metadata"].get("token_count")}
+            for msg in memory.messages
+        ]
+    
+    def get_summary(self, thread_id: Any) -> Optional[str]:
+        """Get the cached rolling summary for a thread, if any"""
+        memory = self._threads.get(self._key(thread_id))
+        return memory.summary if memory is not None else None
+    
+    def begin_load(self, thread_id: Any) -> None:
+        """Mark that history for a thread is being read from the database"""
+        key = self._key(thread_id)
+        if not self._loading.get(key):
+            self._stale.discard(key)
+        self._loading[key] = self._loading.get(key, 0) + 1
+    
+    def finish_load(
+        self,
+        thread_id: Any,
+        messages: Optional[List[Dict[str, Any]]],
+        summary: Optional[str] = None
+    ) -> None:
+        """Store history read from the database unless a write raced with it
+        
+        Pass ``None`` when the load failed so nothing is cached.
+        """
+        key = self._key(thread_id)
+        stale = key in self._stale
+        remaining = self._loading.get(key, 1) - 1
+        if remaining > 0:
+            self._loading[key] = remaining
+        else:
+            self._loading.pop(key, None)
+            self._stale.discard(key)
+        
+        if stale or messages is None or not self.enabled:
+            return
+        
+        memory = Memory(max_messages=self.max_messages)
+        memory.set_session_id(key)
+        memory.summary = summary
+        for msg in messages[-self.max_messages:]:
+            memory.add_message(msg["role"], msg["content"], {"token_count": msg.get("token_count")})
+        self._threads[key] = memory
+        self._threads.move_to_end(key)
+        
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+            self.evictions += 1
+    
+    def append(self, thread_id: Any, role: str, content: Any, token_count: Optional[int] = None) -> None:
+        """Record a message that was just written for a thread"""
+        key = self._key(thread_id)
+        if key in self._loading:
+            self._stale.add(key)
+        memory = self._threads.get(key)
+        if memory is not None:
+            memory.add_message(role, content, {"token_count": token_count})
+            self.appends += 1
+    
+    def invalidate(self, thread_id: Any) -> None:
+        """Drop a thread's cached history, e.g. after an uncertain write"""
+        key = self._key(thread_id)
+        if key in self._loading:
+            self._stale.add(key)
+        if self._threads.pop(key, None) is not None:
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters; each hit is one history query avoided"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threads": len(self._threads),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "appends": self.appends,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions
+        }
+
+
+# Global conversation cache instance
+conversation_cache = ConversationCache()
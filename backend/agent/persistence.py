@@ -0,0 +1,129 @@
+"""Unit-of-work persistence for agent runs"""
+
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.tokens import count_tokens
+from backend.db import AsyncSessionLocal
+from backend.db.models import Message, Run
+from backend.agent.memory import conversation_cache
+from backend.agent.summary import get_summarizer
+
+logger = logging.getLogger(__name__)
+
+
+class RunUnitOfWork:
+    """One session and two commits for the whole life of a run
+
+    ``start`` marks the run as running. ``finish`` writes the final assistant
+    message together with the run's status, result and usage in a single
+    transaction, so a run's outcome is recorded exactly once. The session only
+    holds a connection while a transaction is open, not while the agent works.
+    """
+
+    def __init__(self, run_id: Any, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.run_id = run_id
+        self.db = session_factory()
+        self.run: Optional[Run] = None
+
+    async def __aenter__(self) -> "RunUnitOfWork":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def latest_user_message(self) -> Optional[Message]:
+        """The newest user message in the run's thread
+
+        Call before ``start`` so the read shares its transaction and the
+        connection is released by its commit.
+        """
+        run = await self._get_run()
+        return await self.db.scalar(
+            select(Message).where(
+                Message.thread_id == run.thread_id,
+                Message.role == "user"
+            ).order_by(Message.created_at.desc()).limit(1)
+        )
+
+    async def start(self) -> Run:
+        """Load the run and mark it running"""
+        run = await self._get_run()
+        run.status = "running"
+        run.updated_at = datetime.utcnow()
+        await self.db.commit()
+        return run
+
+    async def finish(
+        self,
+        status: str,
+        result: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None,
+        assistant_content: Optional[str] = None
+    ) -> Optional[Message]:
+        """Record the run's outcome and final assistant message in one transaction"""
+        run = await self._get_run()
+        # Read before the commit, since a rollback expires the instance
+        thread_id = run.thread_id
+        message = None
+        try:
+            if assistant_content is not None:
+                message = Message(
+                    id=uuid.uuid4(),
+                    thread_id=thread_id,
+                    role="assistant",
+                    content=assistant_content,
+                    token_count=count_tokens(assistant_content),
+                    created_at=datetime.utcnow()
+                )
+                self.db.add(message)
+
+            run.status = status
+            if result is not None:
+                run.result = result
+            if usage is not None:
+                run.prompt_tokens = usage.get("prompt_tokens", 0)
+                run.completion_tokens = usage.get("completion_tokens", 0)
+                run.tokens_used = usage.get("total_tokens", 0)
+            run.updated_at = datetime.utcnow()
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            if message is not None:
+                # The commit may or may not have landed; let the next load re-read
+                conversation_cache.invalidate(thread_id)
+            raise
+
+        logger.info(f"Recorded run {self.run_id} as {status}")
+        if message is not None:
+            conversation_cache.append(thread_id, "assistant", assistant_content, message.token_count)
+            # Fold aged-out turns into the thread summary in the background
+            summarizer = get_summarizer()
+            if summarizer is not None:
+                summarizer.schedule(thread_id)
+        return message
+
+    async def fail(self, error_message: str) -> None:
+        """Record the run as failed, discarding anything left uncommitted"""
+        try:
+            await self.db.rollback()
+            # The rollback expired the run; load it again rather than lazily
+            self.run = None
+            await self.finish("error", result=error_message)
+        except Exception as e:
+            logger.error(f"Failed to record error for run {self.run_id}: {e}")
+
+    async def close(self) -> None:
+        await self.db.close()
+
+    async def _get_run(self) -> Run:
+        if self.run is None:
+            self.run = await self.db.scalar(select(Run).where(Run.id == self.run_id))
+            if self.run is None:
+                raise Exception(f"Run {self.run_id} not found")
+        return self.run
@@ -0,0 +1,220 @@
+"""Rolling conversation summaries that keep prompts small on long threads"""
+
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from backend.config import get_settings
+from backend.tokens import count_tokens
+from backend.http_clients import http_clients
+from backend.db import AsyncSessionLocal
+from backend.db.models import Thread, Message
+from backend.agent.memory import conversation_cache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation. Fold the new messages "
+    "into the existing summary, keeping facts, decisions, names and open "
+    "questions. Reply with the updated summary only."
+)
+
+# Prefix of the system message carrying the summary in model prompts
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+# Most messages folded into the summary by one model call
+MAX_BATCH_MESSAGES = 50
+
+# Characters of each message kept by the fallback summary
+EXCERPT_CHARS = 200
+
+
+def select_aged_out(messages: List[Dict[str, Any]], keep_recent: int, min_batch: int) -> List[Dict[str, Any]]:
+    """Messages outside the recent window, or none if fewer than ``min_batch`` have aged out"""
+    aged = messages[:max(len(messages) - keep_recent, 0)]
+    return aged if len(aged) >= min_batch else []
+
+
+def format_transcript(messages: List[Dict[str, Any]]) -> str:
+    """Render messages as ``role: content`` lines"""
+    lines = []
+    for msg in messages:
+        content = msg["content"] if isinstance(msg["content"], str) else json.dumps(msg["content"])
+        lines.append(f"{msg['role']}: {content}")
+    return "\n".join(lines)
+
+
+def extractive_summary(previous: Optional[str], messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Summary made of message excerpts, used when no model is configured
+
+    The oldest lines are dropped first once the summary exceeds ``max_tokens``.
+    """
+    lines = previous.splitlines() if previous else []
+    for line in format_transcript(messages).splitlines():
+        lines.append(line[:EXCERPT_CHARS])
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ConversationSummarizer:
+    """Folds messages that aged out of the recent window into the thread's summary
+
+    Compaction runs as a background task after a run finishes, so it never
+    delays a response. It is incremental: ``threads.summarized_until`` marks
+    the newest folded message and only later messages are read. Each batch is
+    stored with a compare-and-set on that watermark, so concurrent compactions
+    of the same thread cannot fold a message twice.
+    """
+
+    def __init__(self, keep_recent: int = 20, min_batch: int = 10, max_summary_tokens: int = 400):
+        self.settings = get_settings()
+        self.keep_recent = keep_recent
+        self.min_batch = min_batch
+        self.max_summary_tokens = max_summary_tokens
+        # Threads with a compaction in progress, and the tasks running them
+        self._in_flight: Set[str] = set()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.compactions = 0
+        self.messages_folded = 0
+        self.conflicts = 0
+        self.failures = 0
+
+    def schedule(self, thread_id: Any) -> None:
+        """Start compacting a thread in the background unless it already is"""
+        key = str(thread_id)
+        if key in self._in_flight:
+            return
+        self._in_flight.add(key)
+        task = asyncio.create_task(self._compact(thread_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, thread_id: Any) -> None:
+        """Fold aged-out messages into the summary, one batch at a time"""
+        try:
+            while True:
+                loaded = await self._load_pending(thread_id)
+                if loaded is None:
+                    return
+                summary, summarized_until, pending = loaded
+                aged = select_aged_out(pending, self.keep_recent, self.min_batch)
+                if not aged:
+                    return
+
+                batch = aged[:MAX_BATCH_MESSAGES]
+                new_summary = await self._summarize(summary, batch)
+                stored = await self._store(thread_id, new_summary, summarized_until, batch[-1]["created_at"])
+                if not stored:
+                    # Another compaction moved the watermark first
+                    self.conflicts += 1
+                    return
+
+                self.compactions += 1
+                self.messages_folded += len(batch)
+                # Cached history still holds the folded messages
+                conversation_cache.invalidate(thread_id)
+                logger.info(f"Folded {len(batch)} messages into the summary of thread {thread_id}")
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to compact thread {thread_id}: {e}")
+        finally:
+            self._in_flight.discard(str(thread_id))
+
+    async def _load_pending(self, thread_id: Any) -> Optional[Tuple[Optional[str], Any, List[Dict[str, Any]]]]:
+        """Read the current summary, its watermark and all messages after it"""
+        async with AsyncSessionLocal() as db:
+            thread = (await db.execute(
+                select(Thread.summary, Thread.summarized_until).where(Thread.id == thread_id)
+            )).first()
+            if thread is None:
+                return None
+
+            query = select(Message.role, Message.content, Message.created_at).where(
+                Message.thread_id == thread_id
+            )
+            if thread.summarized_until is not None:
+                query = query.where(Message.created_at > thread.summarized_until)
+            rows = (await db.execute(query.order_by(Message.created_at.asc()))).all()
+
+        pending = [{"role": row.role, "content": row.content, "created_at": row.created_at} for row in rows]
+        return thread.summary, thread.summarized_until, pending
+
+    async def _store(self, thread_id: Any, summary: str, previous_until: Any, summarized_until: Any) -> bool:
+        """Save a new summary if the watermark is still the one it was built from"""
+        if previous_until is None:
+            unchanged = Thread.summarized_until.is_(None)
+        else:
+            unchanged = Thread.summarized_until == previous_until
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Thread)
+                .where(Thread.id == thread_id, unchanged)
+                .values(summary=summary, summarized_until=summarized_until)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _summarize(self, previous: Optional[str], messages: List[Dict[str, Any]]) -> str:
+        """Fold ``messages`` into ``previous`` with the model, or excerpts without one"""
+        if not self.settings.OPENAI_API_KEY:
+            return extractive_summary(previous, messages, self.max_summary_tokens)
+
+        payload = {
+            "model": SUMMARY_MODEL,
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{format_transcript(messages)}"
+                }
+            ],
+            "max_tokens": self.max_summary_tokens
+        }
+        headers = {
+            "Authorization": f"Bearer {self.settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+        client = http_clients.get("openai")
+        response = await client.post(
+            f"{self.settings.OPENAI_BASE_URL.rstrip('/')}/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        if response.status_code != 200:
+            raise Exception(f"OpenAI API failed: {response.status_code}")
+
+        content = response.json()["choices"][0]["message"].get("content")
+        if not content:
+            raise Exception("Empty summary returned")
+        return content.strip()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compaction counters"""
+        return {
+            "running": len(self._in_flight),
+            "compactions": self.compactions,
+            "messages_folded": self.messages_folded,
+            "conflicts": self.conflicts,
+            "failures": self.failures
+        }
+
+
+@lru_cache()
+def get_summarizer() -> Optional[ConversationSummarizer]:
+    """Get the process-wide summarizer, or None when summaries are disabled"""
+    settings = get_settings()
+    if not settings.SUMMARY_ENABLED:
+        return None
+    return ConversationSummarizer(
+        keep_recent=settings.SUMMARY_KEEP_RECENT_MESSAGES,
+        min_batch=settings.SUMMARY_MIN_BATCH,
+        max_summary_tokens=settings.SUMMARY_MAX_TOKENS,
+    )
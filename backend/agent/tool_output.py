@@ -0,0 +1,175 @@
+"""Reduction of tool results before they re-enter the model prompt"""
+
+import json
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from backend.tokens import CHARS_PER_TOKEN, count_tokens
+
+# Fields that only matter to operators, never to the model
+REDUNDANT_FIELDS = ("source", "raw_exception")
+
+# Strings shorter than this are never excerpted
+MIN_EXCERPT_TOKENS = 32
+
+# Marks text left out of an excerpt
+ELLIPSIS = " … "
+
+_CHUNK_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9]{3,}")
+
+
+def query_terms(query: str) -> Set[str]:
+    """Lowercased words of three or more characters"""
+    return set(_WORD.findall(query.lower()))
+
+
+def excerpt(text: str, query: str, token_budget: int) -> str:
+    """Keep the sentences of ``text`` most relevant to ``query`` within ``token_budget``
+
+    Sentences are scored by how many query terms they contain. The opening
+    sentence is always kept for context, and the kept sentences stay in their
+    original order with an ellipsis wherever text was skipped.
+    """
+    if count_tokens(text) <= token_budget:
+        return text
+
+    chunks = [chunk.strip() for chunk in _CHUNK_SPLIT.split(text) if chunk.strip()]
+    terms = query_terms(query)
+    scores = [len(terms & set(_WORD.findall(chunk.lower()))) for chunk in chunks]
+    # Lead sentence first, then the best matches, earlier ones winning ties
+    order = [0] + sorted(range(1, len(chunks)), key=lambda i: (-scores[i], i))
+
+    kept: List[int] = []
+    used = 0
+    for index in order:
+        cost = count_tokens(chunks[index]) + 1
+        if used + cost > token_budget:
+            continue
+        kept.append(index)
+        used += cost
+
+    if not kept:
+        # One sentence longer than the whole budget: cut it by characters
+        return text[:token_budget * CHARS_PER_TOKEN].rstrip() + ELLIPSIS.rstrip()
+
+    kept.sort()
+    parts = [chunks[kept[0]]]
+    for previous, index in zip(kept, kept[1:]):
+        parts.append((" " if index == previous + 1 else ELLIPSIS) + chunks[index])
+    if kept[-1] != len(chunks) - 1:
+        parts.append(ELLIPSIS.rstrip())
+    return "".join(parts)
+
+
+def strip_redundant(value: Any) -> Any:
+    """Drop ``REDUNDANT_FIELDS`` from dicts, including those nested in lists"""
+    if isinstance(value, dict):
+        return {key: strip_redundant(item) for key, item in value.items() if key not in REDUNDANT_FIELDS}
+    if isinstance(value, list):
+        return [strip_redundant(item) for item in value]
+    return value
+
+
+def _string_leaves(value: Any, path: tuple = ()) -> List[tuple]:
+    """``(path, text)`` for every string inside a JSON-like value"""
+    if isinstance(value, str):
+        return [(path, value)]
+    if isinstance(value, dict):
+        return [leaf for key, item in value.items() for leaf in _string_leaves(item, path + (key,))]
+    if isinstance(value, list):
+        return [leaf for index, item in enumerate(value) for leaf in _string_leaves(item, path + (index,))]
+    return []
+
+
+def _replace(value: Any, path: tuple, text: str) -> None:
+    for key in path[:-1]:
+        value = value[key]
+    value[path[-1]] = text
+
+
+def reduce_tool_output(data: Any, max_tokens: int, query: str = "", result_id: Optional[str] = None) -> str:
+    """Serialize a tool result for the prompt in at most about ``max_tokens`` tokens
+
+    Redundant fields are dropped first. If the result is still too large, the
+    token budget left after the JSON structure is shared between its long
+    strings in proportion to their size, and each over-budget string is cut
+    down to a query-relevant excerpt. Reduced results carry ``truncated`` and
+    ``result_id`` so the full result can be fetched outside the prompt.
+    """
+    reduced = strip_redundant(data)
+    serialized = json.dumps(reduced)
+    if count_tokens(serialized) <= max_tokens:
+        return serialized
+
+    if isinstance(reduced, str):
+        reduced = {"text": reduced}
+    leaves = [(path, text, count_tokens(text)) for path, text in _string_leaves(reduced)]
+    long_leaves = [leaf for leaf in leaves if leaf[2] >= MIN_EXCERPT_TOKENS]
+
+    # Cost of everything except the long strings
+    skeleton = json.loads(json.dumps(reduced))
+    for path, _, _ in long_leaves:
+        _replace(skeleton, path, "")
+    overhead = count_tokens(json.dumps(skeleton)) + 16
+    budget = max(max_tokens - overhead, MIN_EXCERPT_TOKENS)
+
+    long_total = sum(tokens for _, _, tokens in long_leaves) or 1
+    for path, text, tokens in long_leaves:
+        share = max(budget * tokens // long_total, 1)
+        if tokens > share:
+            _replace(reduced, path, excerpt(text, query, share))
+
+    if isinstance(reduced, dict):
+        reduced["truncated"] = True
+        if result_id is not None:
+            reduced["result_id"] = result_id
+    return json.dumps(reduced)
+
+
+class ToolResultStore:
+    """Bounded LRU of full tool results, keyed by tool call id
+
+    Holds what ``reduce_tool_output`` left out of the prompt so clients can
+    fetch the raw result on demand.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.reduced = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def put(self, result_id: str, result: Dict[str, Any]) -> None:
+        """Remember the full result of a tool call"""
+        self._results[result_id] = result
+        self._results.move_to_end(result_id)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Full result of a tool call, or None if unknown or evicted"""
+        return self._results.get(result_id)
+
+    def record(self, raw_tokens: int, prompt_tokens: int) -> None:
+        """Count the tokens a reduction saved"""
+        self.tokens_in += raw_tokens
+        self.tokens_out += prompt_tokens
+        if prompt_tokens < raw_tokens:
+            self.reduced += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Stored results and prompt tokens saved by reduction"""
+        return {
+            "entries": len(self._results),
+            "reduced": self.reduced,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": self.tokens_in - self.tokens_out
+        }
+
+
+# Global store of full tool results
+tool_results = ToolResultStore()
@@ -1,8 +1,12 @@
 """Agent Tools Package"""
 
+import asyncio
+import json
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -23,6 +27,11 @@ class ToolResult(BaseModel):
 class BaseTool(ABC):
     """Base class for all tools"""
 
+    # Maximum number of concurrent executions of this tool instance
+    max_concurrency: int = 4
+    # Token cap for this tool's result once it is fed back into the prompt
+    max_result_tokens: int = 1000
+
     def __init__(self, name: Optional[str] = None) -> None:
         # Allow subclasses to specify an explicit name while falling back to a
         # derived version of the class name (e.g. ``WebSearchTool`` →
@@ -35,6 +44,14 @@ class BaseTool(ABC):
         )
         self.description: str = self._get_description()
         self.schema: Dict[str, Any] = self._get_schema()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Semaphore capping concurrent executions at ``max_concurrency``"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
     
     @abstractmethod
     def _get_description(self) -> str:
@@ -71,11 +88,47 @@ def get_default_tools() -> List[BaseTool]:
         BrowserTool()
     ]
 
+
+class ToolRegistry:
+    """Immutable set of tools with name lookup and precomputed schemas"""
+
+    def __init__(self, tools: List[BaseTool]) -> None:
+        self._tools = MappingProxyType({tool.name: tool for tool in tools})
+        self.schemas: Tuple[Dict[str, Any], ...] = tuple(tool.schema for tool in tools)
+        # Ready-to-splice JSON for the ``tools`` field of a chat completions request
+        self.schemas_json: str = json.dumps(list(self.schemas))
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        """Look up a tool by name"""
+        return self._tools.get(name)
+
+    @property
+    def tools(self) -> Tuple[BaseTool, ...]:
+        """All registered tools"""
+        return tuple(self._tools.values())
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._tools
+
+    def __iter__(self) -> Iterator[BaseTool]:
+        return iter(self._tools.values())
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+
+@lru_cache()
+def get_tool_registry() -> ToolRegistry:
+    """Get the process-wide tool registry, building it on first use"""
+    return ToolRegistry(get_default_tools())
+
 __all__ = [
     "ToolCall",
     "ToolResult", 
     "BaseTool",
     "WebSearchTool", 
     "BrowserTool",
-    "get_default_tools"
+    "ToolRegistry",
+    "get_default_tools",
+    "get_tool_registry"
 ]
\ No newline at end of file
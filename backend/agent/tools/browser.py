@@ -2,18 +2,23 @@
 
 import os
 import logging
-import httpx
 from typing import Dict, Any, Optional
 from urllib.parse import urlparse
 
 from . import BaseTool, ToolResult
 from backend.config import get_settings
+from backend.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
 class BrowserTool(BaseTool):
     """Tool for extracting content from web pages via Runner or fallback"""
     
+    # Each browse drives a headless browser in the Runner, so keep this low
+    max_concurrency = 2
+    # Page text is long; keep only the parts relevant to the question
+    max_result_tokens = 800
+    
     def __init__(self):
         self.settings = get_settings()
         super().__init__()
@@ -93,21 +98,21 @@ class BrowserTool(BaseTool):
         
         logger.info(f"Calling Runner browse: {runner_url} with URL: {url}")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(runner_url, json=payload, headers=headers)
-            
-            if response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}: {response.text}")
-            
-            data = response.json()
-            logger.info(f"Runner browse response received for URL: {url}")
-            
-            return {
-                "url": url,
-                "title": data.get("title", "No title"),
-                "text": data.get("text", data.get("content", "")),
-                "source": "runner"
-            }
+        client = http_clients.get("runner")
+        response = await client.post(runner_url, json=payload, headers=headers)
+        
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text}")
+        
+        data = response.json()
+        logger.info(f"Runner browse response received for URL: {url}")
+        
+        return {
+            "url": url,
+            "title": data.get("title", "No title"),
+            "text": data.get("text", data.get("content", "")),
+            "source": "runner"
+        }
     
     def _get_stub_result(self, url: str) -> ToolResult:
         """Return stub result when Runner is not available"""
@@ -3,16 +3,18 @@
 import os
 import json
 import logging
-import httpx
 from typing import Dict, Any, List, Optional
 
 from . import BaseTool, ToolResult
 from backend.config import get_settings  # Fixed import
+from backend.http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
 class WebSearchTool(BaseTool):
     """Tool for performing web searches via CoexistAI or fallback"""
+    
+    max_result_tokens = 500
 
     def __init__(self):
         self.settings = get_settings()
@@ -91,52 +93,52 @@ class WebSearchTool(BaseTool):
         
         logger.info(f"Calling CoexistAI web search: {url} with query: {query}")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            
-            if response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}: {response.text}")
-            
-            data = response.json()
-            logger.info(f"CoexistAI search response received for query: {query}")
-            
-            # Handle different response shapes gracefully
-            if "answer" in data:
-                return {
-                    "query": query,
-                    "answer": data["answer"],
-                    "source": "coexistai"
-                }
-            elif "summary" in data:
-                return {
-                    "query": query,
-                    "summary": data["summary"],
-                    "source": "coexistai"
-                }
-            elif "results" in data and isinstance(data["results"], list):
-                # Return top 3 items with title/url/snippet
-                results = data["results"][:3]
-                formatted_results = []
-                for result in results:
-                    formatted_result = {
-                        "title": result.get("title", "No title"),
-                        "url": result.get("url", ""),
-                        "snippet": result.get("snippet", result.get("content", ""))
-                    }
-                    formatted_results.append(formatted_result)
-                
-                return {
-                    "query": query,
-                    "results": formatted_results,
-                    "source": "coexistai"
-                }
-            else:
-                # Return raw JSON under data
-                return {
-                    "query": query,
-                    "data": data,
-                    "source": "coexistai"
+        client = http_clients.get("coexistai")
+        response = await client.post(url, json=payload, headers=headers)
+        
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text}")
+        
+        data = response.json()
+        logger.info(f"CoexistAI search response received for query: {query}")
+        
+        # Handle different response shapes gracefully
+        if "answer" in data:
+            return {
+                "query": query,
+                "answer": data["answer"],
+                "source": "coexistai"
+            }
+        elif "summary" in data:
+            return {
+                "query": query,
+                "summary": data["summary"],
+                "source": "coexistai"
+            }
+        elif "results" in data and isinstance(data["results"], list):
+            # Return top 3 items with title/url/snippet
+            results = data["results"][:3]
+            formatted_results = []
+            for result in results:
+                formatted_result = {
+                    "title": result.get("title", "No title"),
+                    "url": result.get("url", ""),
+                    "snippet": result.get("snippet", result.get("content", ""))
                 }
+                formatted_results.append(formatted_result)
+            
+            return {
+                "query": query,
+                "results": formatted_results,
+                "source": "coexistai"
+            }
+        else:
+            # Return raw JSON under data
+            return {
+                "query": query,
+                "data": data,
+                "source": "coexistai"
+            }
     
     def _get_stub_result(self, query: str) -> ToolResult:
         """Return stub result when CoexistAI is not available"""
@@ -0,0 +1,242 @@
+"""Run event buses that share run events between API processes"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from backend.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more; leave room for the header
+MAX_NOTIFY_BYTES = 7900
+
+# Partially received chunked messages kept before the oldest is dropped
+MAX_PENDING_CHUNKS = 256
+
+# Notifications waiting to be sent before new messages are dropped
+MAX_OUTBOX = 10000
+
+# Seconds between reconnect attempts of the listener
+RECONNECT_SECONDS = 1.0
+
+
+class EventBus(ABC):
+    """Publishes run changes made in this process and mirrors those of others
+
+    ``RunManager`` calls ``publish`` for every run it creates, event it adds
+    and status it sets. A bus delivers those messages to the other processes,
+    which replay them into their own ``RunManager`` so any process can stream
+    any run.
+    """
+
+    @abstractmethod
+    async def start(self, run_manager: Any) -> None:
+        """Begin delivering remote messages to ``run_manager.apply_remote``"""
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Stop delivering and release connections"""
+        pass
+
+    @abstractmethod
+    def publish(self, message: Dict[str, Any]) -> None:
+        """Send a run change to the other processes without blocking"""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Delivery counters"""
+        pass
+
+
+class InMemoryEventBus(EventBus):
+    """Single-process bus: the local ``RunManager`` already has every event"""
+
+    async def start(self, run_manager: Any) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory"}
+
+
+def split_payload(origin: str, message_id: int, payload: str, limit: int = MAX_NOTIFY_BYTES) -> List[str]:
+    """Frame a payload as ``origin:id:index:count:part`` notifications within ``limit`` bytes
+
+    ``payload`` must be ASCII, which ``json.dumps`` guarantees by default.
+    """
+    parts = [payload[start:start + limit] for start in range(0, len(payload), limit)] or [""]
+    return [f"{origin}:{message_id}:{index}:{len(parts)}:{part}" for index, part in enumerate(parts)]
+
+
+class PostgresEventBus(EventBus):
+    """Event bus over Postgres LISTEN/NOTIFY
+
+    Each process holds two connections outside the SQLAlchemy pool: one that
+    LISTENs on ``channel`` and one that sends NOTIFYs. ``publish`` is
+    synchronous and only enqueues; a single sender task keeps messages in
+    order. Payloads larger than the NOTIFY limit are split into chunks and
+    reassembled by the receivers. Messages a process sent itself are ignored
+    when they come back.
+
+    While Postgres is unreachable the outbox fills up to ``max_outbox``
+    notifications, after which whole messages are dropped and counted; other
+    processes then miss those changes.
+    """
+
+    def __init__(self, dsn: str, channel: str = "run_events", max_outbox: int = MAX_OUTBOX):
+        self.dsn = dsn
+        self.channel = channel
+        self.max_outbox = max_outbox
+        self.origin = uuid.uuid4().hex[:12]
+        self.run_manager: Any = None
+        self._outbox: "asyncio.Queue[str]" = asyncio.Queue()
+        self._next_id = 0
+        self._pending: "OrderedDict[tuple, List[Optional[str]]]" = OrderedDict()
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._listener: Any = None
+        self.published = 0
+        self.received = 0
+        self.chunked = 0
+        self.send_errors = 0
+        self.dropped = 0
+        self.outbox_dropped = 0
+
+    async def start(self, run_manager: Any) -> None:
+        self.run_manager = run_manager
+        self._tasks = [
+            asyncio.create_task(self._listen(), name="event-bus-listen"),
+            asyncio.create_task(self._send(), name="event-bus-send"),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self._next_id += 1
+        notifications = split_payload(self.origin, self._next_id, json.dumps(message, default=str))
+        # All chunks of a message or none, so receivers never wait on a partial one
+        if self._outbox.qsize() + len(notifications) > self.max_outbox:
+            self.outbox_dropped += 1
+            return
+        if len(notifications) > 1:
+            self.chunked += 1
+        for notification in notifications:
+            self._outbox.put_nowait(notification)
+        self.published += 1
+
+    async def _connect(self) -> Any:
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def _send(self) -> None:
+        """Drain the outbox in order over one connection, reconnecting on failure"""
+        connection = None
+        try:
+            while True:
+                notification = await self._outbox.get()
+                while True:
+                    try:
+                        if connection is None or connection.is_closed():
+                            connection = await self._connect()
+                        await connection.execute("SELECT pg_notify($1, $2)", self.channel, notification)
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.send_errors += 1
+                        logger.warning(f"Event bus NOTIFY failed, retrying: {e}")
+                        connection = None
+                        await asyncio.sleep(RECONNECT_SECONDS)
+        finally:
+            if connection is not None:
+                await connection.close()
+
+    async def _listen(self) -> None:
+        """Keep a LISTEN connection open, reconnecting when it drops"""
+        while True:
+            connection = None
+            try:
+                connection = await self._connect()
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                self._listener = connection
+                logger.info(f"Event bus listening on '{self.channel}' as {self.origin}")
+                await lost.wait()
+                logger.warning("Event bus listener connection lost; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event bus listener failed, retrying: {e}")
+            finally:
+                self._listener = None
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, notification: str) -> None:
+        origin, message_id, index, count, part = notification.split(":", 4)
+        if origin == self.origin:
+            return
+
+        if count != "1":
+            key = (origin, message_id)
+            parts = self._pending.setdefault(key, [None] * int(count))
+            parts[int(index)] = part
+            if any(chunk is None for chunk in parts):
+                while len(self._pending) > MAX_PENDING_CHUNKS:
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+                return
+            del self._pending[key]
+            part = "".join(parts)
+
+        self.received += 1
+        try:
+            self.run_manager.apply_remote(json.loads(part))
+        except Exception as e:
+            logger.error(f"Failed to apply remote run event: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "postgres",
+            "channel": self.channel,
+            "listening": self._listener is not None,
+            "published": self.published,
+            "received": self.received,
+            "chunked": self.chunked,
+            "outbox": self._outbox.qsize(),
+            "send_errors": self.send_errors,
+            "dropped_chunks": self.dropped,
+            "outbox_dropped": self.outbox_dropped,
+        }
+
+
+@lru_cache()
+def get_event_bus() -> EventBus:
+    """Get the process-wide event bus selected by ``EVENT_BUS_BACKEND``"""
+    settings = get_settings()
+    if settings.EVENT_BUS_BACKEND == "postgres":
+        from backend.db.models import make_async_url
+
+        # asyncpg takes a plain postgresql:// DSN
+        dsn = make_async_url(settings.DATABASE_URL).replace("postgresql+asyncpg://", "postgresql://", 1)
+        return PostgresEventBus(dsn, channel=settings.EVENT_BUS_CHANNEL)
+    return InMemoryEventBus()
@@ -0,0 +1,138 @@
+"""Durable log of run events in the run_events table"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.models import AsyncSessionLocal, RunEventRecord
+
+logger = logging.getLogger(__name__)
+
+
+class RunEventWriter:
+    """Write-behind batcher that copies run events into ``run_events``
+
+    ``append`` is synchronous and only buffers. A background task flushes the
+    buffer as soon as ``batch_size`` rows are waiting, or ``flush_interval``
+    seconds after the first row arrived, with one multi-row INSERT per batch.
+    It sleeps while the buffer is empty. Rows beyond ``max_pending`` and
+    batches the database rejects are dropped and counted; live subscribers
+    still get those events from memory.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 0.2,
+        max_pending: int = 10000,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self._rows: List[Dict[str, Any]] = []
+        self._has_rows = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="run-event-writer")
+
+    async def stop(self) -> None:
+        """Write whatever is still buffered, then stop the background task"""
+        self._stopping = True
+        self._has_rows.set()
+        self._batch_full.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Rows appended while the last batch was being written
+        await self.flush()
+
+    def append(self, run_id: str, seq: int, event: Dict[str, Any]) -> None:
+        """Buffer an event for the next batch"""
+        if len(self._rows) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._rows.append({
+            "run_id": run_id,
+            "seq": seq,
+            "event_type": event["event"],
+            "data": event["data"],
+            "created_at": datetime.fromisoformat(event["timestamp"]),
+        })
+        self._has_rows.set()
+        if len(self._rows) >= self.batch_size:
+            self._batch_full.set()
+
+    def flush_soon(self) -> None:
+        """Write buffered rows now rather than at the end of the interval"""
+        if self._rows:
+            self._batch_full.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            await self._has_rows.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Insert every buffered row, ``batch_size`` rows per statement"""
+        rows, self._rows = self._rows, []
+        self._has_rows.clear()
+        self._batch_full.clear()
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        insert(RunEventRecord)
+                        .values(batch)
+                        .on_conflict_do_nothing(index_elements=["run_id", "seq"])
+                    )
+                    await db.commit()
+            except Exception as e:
+                self.failures += 1
+                self.dropped += len(batch)
+                logger.error(f"Failed to write {len(batch)} run events: {e}")
+                continue
+            self.written += len(batch)
+            self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffered, written and dropped rows"""
+        return {
+            "pending": len(self._rows),
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+async def load_run_events(db: AsyncSession, run_id: str, since: int = 0) -> List[Dict[str, Any]]:
+    """A run's logged events from id ``since`` on, oldest first, shaped like the run manager's"""
+    rows = await db.execute(
+        select(RunEventRecord.seq, RunEventRecord.event_type, RunEventRecord.data, RunEventRecord.created_at)
+        .where(RunEventRecord.run_id == run_id, RunEventRecord.seq >= since)
+        .order_by(RunEventRecord.seq)
+    )
+    return [
+        {"id": row.seq, "event": row.event_type, "data": row.data, "timestamp": row.created_at.isoformat()}
+        for row in rows
+    ]
@@ -0,0 +1,213 @@
+"""Durable overflow storage for run events evicted from memory"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+class _SpillFile:
+    """One run's spill file plus the events still on their way to it"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        # Id and byte offset of every written event, for seeking
+        self.ids: List[int] = []
+        self.offsets: List[int] = []
+        self.size = 0
+        # Events being written by the writer task, and those waiting for the next batch
+        self.writing: List[Dict[str, Any]] = []
+        self.pending: List[Dict[str, Any]] = []
+
+
+class FileEventSpill:
+    """Append-only JSONL file per run holding its oldest events
+
+    ``append`` is synchronous and only buffers; a background task writes the
+    buffered events off the event loop. Reads seek straight to the first
+    requested event. Ids need not start at 0 or be contiguous: a run mirrored
+    from another process starts midway, and events that failed to spill are
+    missing.
+
+    Each process spills into its own subdirectory of ``directory``. Those
+    left by processes that are gone are removed at startup.
+    """
+
+    def __init__(self, directory: str, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self.directory = Path(directory) / str(os.getpid())
+        self._clear_stale(Path(directory))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._files: Dict[str, _SpillFile] = {}
+        self._sequence = itertools.count()
+        self._pending_events = 0
+        self._unlink: List[Path] = []
+        self._has_work = asyncio.Event()
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self.spilled_events = 0
+        self.spilled_bytes = 0
+        self.reads = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def _clear_stale(self, root: Path) -> None:
+        """Remove spill files of this process's predecessors and of processes that are gone"""
+        if not root.exists():
+            return
+        for path in root.iterdir():
+            if path.is_dir():
+                if path.name.isdigit() and path != self.directory and _process_alive(int(path.name)):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.suffix == ".jsonl":
+                path.unlink(missing_ok=True)
+
+    def append(self, run_id: str, events: List[Dict[str, Any]]) -> bool:
+        """Queue events to be written after those already spilled for the run"""
+        if self._pending_events + len(events) > self.max_pending:
+            self.dropped += len(events)
+            return False
+        spill_file = self._files.get(run_id)
+        if spill_file is None:
+            # A fresh name per file, so a deleted run's late writes never reach its successor
+            name = f"{_UNSAFE.sub('_', run_id)}-{next(self._sequence)}.jsonl"
+            spill_file = self._files[run_id] = _SpillFile(self.directory / name)
+        spill_file.pending.extend(events)
+        self._pending_events += len(events)
+        self._wake_writer()
+        return True
+
+    def _wake_writer(self) -> None:
+        self._has_work.set()
+        if self._writer is None or self._writer.done():
+            try:
+                self._writer = asyncio.get_running_loop().create_task(self._write_batches(), name="event-spill")
+            except RuntimeError:
+                # No loop (sync callers); events stay readable from memory
+                pass
+
+    async def _write_batches(self) -> None:
+        while True:
+            await self._has_work.wait()
+            self._has_work.clear()
+            batch = [spill_file for spill_file in self._files.values() if spill_file.pending]
+            for spill_file in batch:
+                spill_file.writing, spill_file.pending = spill_file.pending, []
+            unlink, self._unlink = self._unlink, []
+            try:
+                results = await asyncio.to_thread(self._write, batch, unlink)
+            except Exception as e:
+                logger.error(f"Failed to spill run events: {e}")
+                results = [(spill_file, None, 0) for spill_file in batch]
+            for spill_file, offsets, size in results:
+                written = spill_file.writing
+                spill_file.writing = []
+                self._pending_events -= len(written)
+                if offsets is None:
+                    self.errors += 1
+                    self.dropped += len(written)
+                    continue
+                spill_file.ids.extend(event["id"] for event in written)
+                spill_file.offsets.extend(offsets)
+                spill_file.size += size
+                self.spilled_events += len(written)
+                self.spilled_bytes += size
+
+    @staticmethod
+    def _write(
+        batch: List[_SpillFile], unlink: List[Path]
+    ) -> List[Tuple[_SpillFile, Optional[List[int]], int]]:
+        """Append each file's events, returning their offsets and size, or None offsets on failure (runs in a thread)"""
+        results = []
+        for spill_file in batch:
+            lines = [(json.dumps(event, default=str) + "\n").encode() for event in spill_file.writing]
+            offsets = list(itertools.accumulate((len(line) for line in lines[:-1]), initial=spill_file.size))
+            try:
+                with open(spill_file.path, "ab") as f:
+                    f.write(b"".join(lines))
+            except OSError as e:
+                logger.error(f"Failed to spill events to {spill_file.path.name}: {e}")
+                results.append((spill_file, None, 0))
+                continue
+            results.append((spill_file, offsets, sum(len(line) for line in lines)))
+        for path in unlink:
+            path.unlink(missing_ok=True)
+        return results
+
+    async def read(self, run_id: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Spilled events of a run with ids from ``start`` up to ``end``"""
+        spill_file = self._files.get(run_id)
+        if spill_file is None:
+            return []
+        self.reads += 1
+        # Snapshot what is on disk and in memory together, since writes land while we read
+        unwritten = [event for event in spill_file.writing + spill_file.pending if start <= event["id"] < end]
+        first = bisect_left(spill_file.ids, start)
+        last = bisect_left(spill_file.ids, end)
+        if first == last:
+            return unwritten
+        stop = spill_file.offsets[last] if last < len(spill_file.ids) else spill_file.size
+        try:
+            events = await asyncio.to_thread(self._read, spill_file.path, spill_file.offsets[first], stop)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Failed to read spilled events of run {run_id}: {e}")
+            events = []
+        return events + unwritten
+
+    @staticmethod
+    def _read(path: Path, offset: int, stop: int) -> List[Dict[str, Any]]:
+        """Events stored between two byte offsets (runs in a thread)"""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return [json.loads(line) for line in f.read(stop - offset).splitlines()]
+
+    def delete(self, run_id: str) -> None:
+        """Forget a run's spilled events; the writer removes the file"""
+        spill_file = self._files.pop(run_id, None)
+        if spill_file is None:
+            return
+        self._pending_events -= len(spill_file.pending)
+        spill_file.pending = []
+        self._unlink.append(spill_file.path)
+        self._wake_writer()
+
+    async def stop(self) -> None:
+        """Stop the writer; spill files are only useful to this process"""
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Spill volume and failures"""
+        return {
+            "backend": "file",
+            "files": len(self._files),
+            "pending_events": self._pending_events,
+            "spilled_events": self.spilled_events,
+            "spilled_bytes": self.spilled_bytes,
+            "reads": self.reads,
+            "errors": self.errors,
+            "dropped": self.dropped,
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -1,19 +1,22 @@
 import uuid
-import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.agent import AgentLoop  # Fixed import
-from backend.db.models import get_db, User, Thread, Message, Run, SessionLocal  # Fixed import
+from backend.agent import AgentLoop, RunUnitOfWork, conversation_cache, get_summarizer, speculation_stats, tool_results  # Fixed import
+from backend.db.models import get_async_db, get_pool_stats, User, Thread, Message, Run, AsyncSessionLocal  # Fixed import
 from backend.config import get_settings  # Fixed import
+from backend.http_clients import http_clients
+from backend.llm_cache import get_llm_cache
 from .utils import (
+    TERMINAL_STATUSES,
     run_manager,
+    sse_frame,
+    event_frame,
     validate_role,
     get_thread_by_id,
     get_run_by_id,
@@ -21,9 +24,13 @@ from .utils import (
     create_thread_with_defaults,
     create_message_with_defaults,
     create_run_with_defaults,
-    update_run_in_db,
+    get_thread_usage,
+    get_user_usage,
     sanitize_content
 )
+from .scheduler import QueueFull, get_run_scheduler
+from .event_bus import get_event_bus
+from .event_log import load_run_events
 
 router = APIRouter()
 settings = get_settings()
@@ -38,79 +45,93 @@ class CreateThreadResponse(BaseModel):
 class CreateMessageRequest(BaseModel):
     role: str
     content: str
+    # Set to false to bypass the LLM response cache for this run
+    cache: bool = True
 
 class CreateMessageResponse(BaseModel):
     run_id: str
+    # Runs ahead of this one in the scheduler queue; 0 once it is running
+    queue_position: int = 0
 
 # Utility Functions
-def get_or_create_user(db: Session, user_id: Optional[str] = None) -> User:
+async def get_or_create_user(db: AsyncSession, user_id: Optional[str] = None) -> User:
     """Get existing user or create a new one"""
     if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.scalar(select(User).where(User.id == user_id))
         if user:
             return user
     
     # Create new user using utility function
-    return create_user_with_defaults(db, user_id)
+    return await create_user_with_defaults(db, user_id)
 
-async def execute_agent_run(run_id: str, thread_id: str, user_message: str):
-    """Execute agent run in background using its own database session"""
-    db = SessionLocal()
+async def execute_agent_run(run_id: str, thread_id: str, user_message: str, use_cache: bool = True):
+    """Execute agent run in background, persisting it through one unit of work"""
+    unit_of_work = RunUnitOfWork(run_id)
     try:
         # Update run status to running
-        update_run_in_db(db, run_id, "running")
-
-        # Store run data for SSE streaming using run manager
-        run_manager.create_run_data(run_id, thread_id, sanitize_content(user_message))
+        await unit_of_work.start()
+        run_manager.update_status(run_id, "running")
 
         # Initialize agent loop
         agent_loop = AgentLoop()
 
-        final_response, event_stream = await agent_loop.run_agent(uuid.UUID(thread_id), user_message)
-        async for event_json in event_stream:
-            event = json.loads(event_json)
-            if event.get("type") == "message":
-                run_manager.add_event(run_id, "token", event.get("content", ""))
-            elif event.get("type") == "tool_call":
-                run_manager.add_event(run_id, "tool", event.get("tool_call"))
-            elif event.get("type") == "tool_result":
-                run_manager.add_event(run_id, "tool", event.get("result"))
+        # Forward agent events to SSE subscribers the moment they happen
+        final_response = ""
+        usage = None
+        status = "completed"
+        async for event in agent_loop.run_agent(uuid.UUID(thread_id), user_message, use_cache=use_cache):
+            if event["type"] == "token":
+                run_manager.add_event(run_id, "token", event["content"])
+            elif event["type"] == "message":
+                final_response = event["content"]
+                usage = event["usage"]
+                # A run cut short by its deadline keeps its partial answer
+                if event.get("timed_out"):
+                    status = "timeout"
+                # Streamed content has already been emitted token by token
+                if not event.get("streamed"):
+                    run_manager.add_event(run_id, "token", final_response)
+            elif event["type"] == "tool_call":
+                run_manager.add_event(run_id, "tool", event["tool_call"])
+            elif event["type"] == "tool_result":
+                # Results can finish out of order, so tag them with their call
+                run_manager.add_event(run_id, "tool", {**event["result"], "tool_call_id": event["tool_call_id"]})
 
-        # Sanitize and store final response
+        # Sanitize final response
         final_content = sanitize_content(final_response)
 
-        # Create assistant message in database
-        create_message_with_defaults(db, thread_id, "assistant", final_content)
+        # Write the assistant message and run status, result and usage in one commit
+        await unit_of_work.finish(status, result=final_content, usage=usage, assistant_content=final_content)
 
         # Add final done event
         run_manager.add_event(run_id, "done", {
             "message": final_content,
-            "status": "completed"
+            "status": status,
+            "usage": usage
         })
 
-        # Update run status to completed
-        update_run_in_db(db, run_id, "completed", final_content)
-        run_manager.update_status(run_id, "completed")
+        # Update run status to completed (or timeout)
+        run_manager.update_status(run_id, status)
 
     except Exception as e:
         # Handle errors
         error_message = f"Error executing run: {str(e)}"
         run_manager.add_event(run_id, "error", {"error": error_message})
         run_manager.update_status(run_id, "error")
-        update_run_in_db(db, run_id, "error", error_message)
+        await unit_of_work.fail(error_message)
     finally:
-        db.close()
+        await unit_of_work.close()
 
 # API Endpoints
 @router.post("/threads", response_model=CreateThreadResponse)
-async def create_thread(request: CreateThreadRequest, db: Session = Depends(get_db)):
+async def create_thread(request: CreateThreadRequest, db: AsyncSession = Depends(get_async_db)):
     """Create a new thread"""
     try:
         # Get or create user
-        user = get_or_create_user(db, request.user_id)
+        user = await get_or_create_user(db, request.user_id)
         
         # Create thread
-        thread = create_thread_with_defaults(db, user.id)
+        thread = await create_thread_with_defaults(db, user.id)
         
         # Pydantic response model expects a string, so cast the UUID
         return CreateThreadResponse(thread_id=str(thread.id))
@@ -119,11 +140,25 @@ async def create_thread(request: CreateThreadRequest, db: Session = Depends(get_
         raise HTTPException(status_code=500, detail=f"error to create thread: {str(e)}")
 
 @router.post("/threads/{thread_id}/messages", response_model=CreateMessageResponse)
-async def create_message(thread_id: str, request: CreateMessageRequest, db: Session = Depends(get_db)):
-    """Create a message and start a run"""
+async def create_message(thread_id: str, request: CreateMessageRequest, db: AsyncSession = Depends(get_async_db)):
+    """Create a message and schedule a run"""
+    scheduler = get_run_scheduler()
+    reserved = False
+    if request.role == "user":
+        # Refuse before writing anything when the run queue is full
+        try:
+            scheduler.reserve()
+        except QueueFull as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many runs in progress, retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        reserved = True
+
     try:
         # Verify thread exists
-        thread = get_thread_by_id(db, thread_id)
+        thread = await get_thread_by_id(db, thread_id)
         if not thread:
             raise HTTPException(status_code=404, detail="Thread not found")
         
@@ -135,112 +170,132 @@ async def create_message(thread_id: str, request: CreateMessageRequest, db: Sess
         sanitized_content = sanitize_content(request.content)
         
         # Create message record
-        create_message_with_defaults(db, thread_id, request.role, sanitized_content)
+        message = await create_message_with_defaults(db, thread_id, request.role, sanitized_content)
+        conversation_cache.append(thread_id, request.role, sanitized_content, message.token_count)
 
-        # If it's a user message, create and start a run
+        # If it's a user message, create and schedule a run
         if request.role == "user":
             # Create run record
-            run = create_run_with_defaults(db, thread_id, "queued")
+            run = await create_run_with_defaults(db, thread_id, "queued")
+            run_id = str(run.id)
 
-            # Start background task to execute the run
-            asyncio.create_task(execute_agent_run(run.id, thread_id, sanitized_content))
+            # Register the run before it is scheduled so queue events have somewhere to go
+            run_manager.create_run_data(run_id, thread_id, sanitized_content, status="queued")
+            position = scheduler.submit(
+                run_id,
+                lambda: execute_agent_run(run_id, thread_id, sanitized_content, request.cache)
+            )
+            reserved = False
 
-            return CreateMessageResponse(run_id=str(run.id))
+            return CreateMessageResponse(run_id=run_id, queue_position=position)
         else:
             # For assistant messages, create a dummy run (or handle differently)
-            run = create_run_with_defaults(db, thread_id, "completed")
+            run = await create_run_with_defaults(db, thread_id, "completed")
             return CreateMessageResponse(run_id=str(run.id))
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"error to create message: {str(e)}")
+    finally:
+        if reserved:
+            scheduler.release()
 
 @router.get("/runs/{run_id}/events")
-async def get_run_events(run_id: str, request: Request, db: Session = Depends(get_db)):
+async def get_run_events(run_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Stream run events via SSE with proper event formatting"""
     # Verify run exists
-    run = get_run_by_id(db, run_id)
+    run = await get_run_by_id(db, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
+    # Don't hold a pooled connection for the life of the stream
+    await db.close()
+
+    # A reconnecting client resumes after the last event id it saw
+    last_event_id = request.headers.get("last-event-id", "")
+    start_index = int(last_event_id) + 1 if last_event_id.isdigit() else 0
     
     async def event_stream():
-        """Generate SSE events with proper formatting and heartbeat"""
+        """Generate SSE events as the run manager pushes them, plus shared heartbeats"""
         import time
         
-        last_event_index = 0
-        last_heartbeat = time.time()
+        last_event_index = start_index
+        check_database = True
+        waiter = None
+        # Keeps the run in memory while this stream is open
+        run_manager.subscribe(run_id)
          
         try:
             while True:
-                # Check if client disconnected
-                if await request.is_disconnected():
-                    break
-                
+                # Take the waiter first so a change made while we read still wakes us
+                waiter = run_manager.waiter(run_id)
+
                 # Check if run exists in active runs
                 run_data = run_manager.get_run_data(run_id)
                 if run_data:
-                    # Get new events since last index
-                    new_events = run_manager.get_events_since(run_id, last_event_index)
+                    # Read before the frames, which snapshot the buffer before any await,
+                    # so none added while reading the spill or sending are missed
+                    status = run_data["status"]
+                    # Absolute, so events dropped without a spill are skipped rather than repeated
+                    next_event_index = run_manager.event_count(run_id)
+                    # Frames of new events, encoded once when added and shared by every subscriber
+                    new_frames = await run_manager.get_frames_since(run_id, last_event_index)
                     
-                    # Send new events with proper type/data structure
-                    for event in new_events:
-                        event_type = event.get("event", "message")
-                        event_data = {
-                            "type": event_type,
-                            "data": event["data"]
-                        }
-                        yield f"event: {event_type}\n"
-                        yield f"data: {json.dumps(event_data)}\n\n"
-                        last_event_index += 1
+                    for frame in new_frames:
+                        yield frame
+                    last_event_index = next_event_index
                     
                     # Check if run is completed
-                    if run_data["status"] in ["completed", "error"]:
+                    if status in TERMINAL_STATUSES:
                         final_data = {
                             "type": "run_completed",
-                            "status": run_data["status"]
+                            "status": status
                         }
-                        yield f"event: done\n"
-                        yield f"data: {json.dumps(final_data)}\n\n"
+                        yield sse_frame("done", final_data)
                         break
-                else:
-                    # Run not in active runs, check database status
-                    db.refresh(run)
-                    if run.status in ["completed", "error"]:
+                elif check_database:
+                    # Run not in memory here, check database status
+                    async with AsyncSessionLocal() as session:
+                        run = await get_run_by_id(session, run_id)
+                        missed_events = []
+                        if run.status in TERMINAL_STATUSES:
+                            missed_events = await load_run_events(session, run_id, since=last_event_index)
+                    if run.status in TERMINAL_STATUSES:
+                        # Replay what the client missed from the event log
+                        for event in missed_events:
+                            yield event_frame(event)
                         # Send final event if not already sent
                         final_data = {
                             "type": "run_completed",
                             "message": run.result or "Run completed",
                             "status": run.status
                         }
-                        yield f"event: done\n"
-                        yield f"data: {json.dumps(final_data)}\n\n"
+                        yield sse_frame("done", final_data)
                         break
                 
-                # Send heartbeat every 15 seconds
-                current_time = time.time()
-                if current_time - last_heartbeat >= 15:
+                # Sleep until the run changes or the shared ticker sends a heartbeat;
+                # disconnects cancel this await, so there is nothing to poll
+                heartbeat = await waiter
+                # A run unknown here is re-checked in the database on heartbeats only
+                check_database = heartbeat
+                if heartbeat:
                     heartbeat_data = {
                         "type": "heartbeat",
-                        "timestamp": int(current_time)
+                        "timestamp": int(time.time())
                     }
-                    yield f"event: heartbeat\n"
-                    yield f"data: {json.dumps(heartbeat_data)}\n\n"
-                    last_heartbeat = current_time
-                
-                # Wait before checking for new events
-                await asyncio.sleep(0.1)
+                    yield sse_frame("heartbeat", heartbeat_data)
                 
         except Exception as e:
             error_data = {
                 "type": "error",
                 "message": str(e)
             }
-            yield f"event: error\n"
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield sse_frame("error", error_data)
         finally:
-            # Clean up active run data
-            run_manager.cleanup_run(run_id)
+            if waiter is not None:
+                run_manager.discard_waiter(run_id, waiter)
+            # Other streams may still be reading; the run expires after its retention
+            run_manager.unsubscribe(run_id)
     
     return StreamingResponse(
         event_stream(),
@@ -249,10 +304,67 @@ async def get_run_events(run_id: str, request: Request, db: Session = Depends(ge
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Cache-Control"
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID"
         }
     )
 
+@router.get("/runs/{run_id}/logs")
+async def get_run_logs(run_id: str, db: AsyncSession = Depends(get_async_db)):
+    """All events of a run: from memory while all of them are held here, otherwise from the run_events table"""
+    run = await get_run_by_id(db, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    run_data = run_manager.get_run_data(run_id)
+    if run_data is not None and run_data["first_index"] == 0:
+        return {"run_id": run_id, "events": await run_manager.get_events_since(run_id, 0)}
+    events = await load_run_events(db, run_id)
+    if run_data is not None:
+        # Older events left memory; add the ones the log has not written yet
+        next_index = events[-1]["id"] + 1 if events else 0
+        events += await run_manager.get_events_since(run_id, next_index)
+    return {"run_id": run_id, "events": events}
+
+@router.get("/threads/{thread_id}/usage")
+async def get_thread_usage_endpoint(thread_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Token usage summed over a thread's runs"""
+    thread = await get_thread_by_id(db, thread_id)
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return {"thread_id": thread_id, **(await get_thread_usage(db, thread_id))}
+
+@router.get("/users/{user_id}/usage")
+async def get_user_usage_endpoint(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Token usage summed over all of a user's runs"""
+    return {"user_id": user_id, **(await get_user_usage(db, user_id))}
+
+@router.get("/tool-results/{tool_call_id}")
+async def get_tool_result(tool_call_id: str):
+    """Full result of a tool call, as it was before reduction for the prompt"""
+    result = tool_results.get(tool_call_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Tool result not found")
+    return {"tool_call_id": tool_call_id, "result": result}
+
+# Metrics endpoint
+@router.get("/metrics")
+async def get_metrics():
+    """In-process performance counters"""
+    llm_cache = get_llm_cache()
+    summarizer = get_summarizer()
+    return {
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "http_clients": http_clients.stats(),
+        "db_pool": get_pool_stats(),
+        "conversation_cache": conversation_cache.stats(),
+        "speculative_search": speculation_stats.stats(),
+        "summarizer": summarizer.stats() if summarizer else None,
+        "tool_output": tool_results.stats(),
+        "run_scheduler": get_run_scheduler().stats(),
+        "event_bus": get_event_bus().stats(),
+        "run_manager": run_manager.stats(),
+        "run_event_log": run_manager.log.stats() if run_manager.log is not None else None
+    }
+
 # Health check endpoint
 @router.get("/health")
 async def health_check():
@@ -0,0 +1,181 @@
+"""In-process run scheduler with a concurrency limit and a bounded queue"""
+
+import asyncio
+import logging
+import math
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import get_settings
+from backend.db.models import AsyncSessionLocal, Run
+from .utils import run_manager
+
+logger = logging.getLogger(__name__)
+
+RunJob = Callable[[], Awaitable[Any]]
+
+# Assumed run duration until one has been measured, for Retry-After estimates
+DEFAULT_RUN_SECONDS = 5.0
+
+# Result recorded for runs that were queued or running when the server stopped
+SHUTDOWN_ERROR = "Run interrupted: the server shut down"
+
+
+class QueueFull(Exception):
+    """Raised when the run queue has no room; carries a Retry-After hint"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Run queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RunScheduler:
+    """Runs at most ``max_concurrent`` jobs at once, queueing up to ``max_queue`` more
+
+    Callers ``reserve`` a slot before doing any work for a new run, so a full
+    queue is rejected up front, then ``submit`` the job once the run exists.
+    Queued runs get a ``queued`` event with their position whenever it
+    changes. Every started task is referenced until it finishes.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_queue: int = 100,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.session_factory = session_factory
+        self._running: Dict[str, "asyncio.Task[Any]"] = {}
+        self._queue: "OrderedDict[str, RunJob]" = OrderedDict()
+        self._reserved = 0
+        self._started_at: Dict[str, float] = {}
+        # Moving average of run durations, for Retry-After estimates
+        self._avg_run_seconds = DEFAULT_RUN_SECONDS
+        self.started = 0
+        self.finished = 0
+        self.rejected = 0
+
+    def _pending(self) -> int:
+        return len(self._running) + len(self._queue) + self._reserved
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up"""
+        waves = (len(self._queue) + 1) / max(self.max_concurrent, 1)
+        return max(math.ceil(self._avg_run_seconds * waves), 1)
+
+    def reserve(self) -> None:
+        """Claim room for one run, raising ``QueueFull`` if there is none"""
+        if self._pending() >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+        self._reserved += 1
+
+    def release(self) -> None:
+        """Give back a reservation that will not be submitted"""
+        self._reserved = max(self._reserved - 1, 0)
+
+    def submit(self, run_id: str, job: RunJob) -> int:
+        """Start or queue a reserved run, returning its queue position (0 if started)"""
+        self.release()
+        run_id = str(run_id)
+        if len(self._running) < self.max_concurrent and not self._queue:
+            self._start(run_id, job)
+            return 0
+        self._queue[run_id] = job
+        position = len(self._queue)
+        run_manager.add_event(run_id, "queued", {"position": position})
+        return position
+
+    def _start(self, run_id: str, job: RunJob) -> None:
+        task = asyncio.create_task(job(), name=f"run-{run_id}")
+        self._running[run_id] = task
+        self._started_at[run_id] = time.monotonic()
+        self.started += 1
+        task.add_done_callback(lambda done: self._on_done(run_id, done))
+
+    def _on_done(self, run_id: str, task: "asyncio.Task[Any]") -> None:
+        self._running.pop(run_id, None)
+        started_at = self._started_at.pop(run_id, None)
+        if started_at is not None:
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * (time.monotonic() - started_at)
+        self.finished += 1
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Run {run_id} raised: {task.exception()}")
+
+        # Start queued runs in arrival order, then tell the rest where they stand
+        while self._queue and len(self._running) < self.max_concurrent:
+            next_run_id, job = self._queue.popitem(last=False)
+            self._start(next_run_id, job)
+        for position, queued_run_id in enumerate(self._queue, start=1):
+            run_manager.add_event(queued_run_id, "queued", {"position": position})
+
+    def position(self, run_id: str) -> int:
+        """Current queue position of a run, 0 if it is not queued"""
+        for position, queued_run_id in enumerate(self._queue, start=1):
+            if queued_run_id == str(run_id):
+                return position
+        return 0
+
+    async def shutdown(self) -> None:
+        """Drop queued runs and cancel running ones, recording all of them as errors
+
+        Cancelled runs never reach their own error handling, so their
+        subscribers get an ``error`` event here and their rows are moved out of
+        ``queued``/``running`` in one UPDATE.
+        """
+        run_ids = list(self._queue) + list(self._running)
+        self._queue.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not run_ids:
+            return
+
+        for run_id in run_ids:
+            run_manager.add_event(run_id, "error", {"error": SHUTDOWN_ERROR})
+            run_manager.update_status(run_id, "error")
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(Run)
+                    .where(Run.id.in_([uuid.UUID(run_id) for run_id in run_ids]), Run.status.in_(["queued", "running"]))
+                    .values(status="error", result=SHUTDOWN_ERROR, updated_at=datetime.utcnow())
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to record {len(run_ids)} interrupted runs: {e}")
+            return
+        logger.info(f"Recorded {len(run_ids)} interrupted runs as errors")
+
+    def stats(self) -> Dict[str, Any]:
+        """Occupancy and throughput counters"""
+        return {
+            "running": len(self._running),
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "started": self.started,
+            "finished": self.finished,
+            "rejected": self.rejected,
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+        }
+
+
+@lru_cache()
+def get_run_scheduler() -> RunScheduler:
+    """Get the process-wide run scheduler"""
+    settings = get_settings()
+    return RunScheduler(
+        max_concurrent=settings.MAX_CONCURRENT_RUNS,
+        max_queue=settings.RUN_QUEUE_SIZE,
+    )
@@ -1,97 +1,407 @@
 """Utility functions for API routes"""
 
 import uuid
+import json
+import time
+import heapq
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from typing import Dict, Any, Optional, List, Tuple
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.db.models import User, Thread, Message, Run  # Fixed import
+from backend.tokens import count_tokens
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
 
 # Type definitions
 RunEvent = Dict[str, Any]
 RunData = Dict[str, Any]
 
+# Statuses after which a run produces no more events
+TERMINAL_STATUSES = ("completed", "failed", "error", "timeout")
+
+# Seconds between heartbeats sent to idle SSE subscribers
+HEARTBEAT_SECONDS = 15
+
+def encode_json(value: Any) -> bytes:
+    """Compact JSON as bytes, with orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder handles
+            pass
+    return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False).encode()
+
+def sse_frame(event_type: str, payload: Any, event_id: Optional[int] = None) -> bytes:
+    """A complete SSE frame: optional ``id:`` line, ``event:`` line and JSON ``data:`` line"""
+    id_line = b"id: %d\n" % event_id if event_id is not None else b""
+    return b"%sevent: %s\ndata: %s\n\n" % (id_line, event_type.encode(), encode_json(payload))
+
+def event_frame(event: RunEvent) -> bytes:
+    """SSE frame of a run event, carrying the ``{"type", "data"}`` payload clients expect"""
+    return sse_frame(event["event"], {"type": event["event"], "data": event["data"]}, event["id"])
+
 class RunManager:
-    """Manages active runs and their events"""
+    """Manages active runs and their events
+
+    Events are buffered in memory, bounded per run and in total, and numbered
+    so SSE clients can resume with ``Last-Event-ID``. Completed runs are kept
+    for ``retention_seconds`` before they expire.
+    """
     
-    def __init__(self, retention_seconds: int = 300):
+    def __init__(
+        self,
+        retention_seconds: int = 300,
+        heartbeat_seconds: float = HEARTBEAT_SECONDS,
+        max_events_per_run: int = 1000,
+        max_buffer_bytes: int = 64 * 1024 * 1024
+    ):
         # Runs currently streaming
         self.active_runs: Dict[str, RunData] = {}
         # Completed runs preserved for later inspection
         self.completed_runs: Dict[str, RunData] = {}
         self.retention_seconds = retention_seconds
+        # Shares local run changes with other processes; set at startup
+        self.bus: Optional[Any] = None
+        # Futures of subscribers waiting for the next change of each run
+        self._waiters: Dict[str, List["asyncio.Future[bool]"]] = {}
+        self.heartbeat_seconds = heartbeat_seconds
+        self._ticker: Optional["asyncio.Task[None]"] = None
+        self.max_events_per_run = max_events_per_run
+        self.max_buffer_bytes = max_buffer_bytes
+        # Durable storage for evicted events; set at startup
+        self.spill: Optional[Any] = None
+        # Write-behind copy of this process's run events to the database; set at startup
+        self.log: Optional[Any] = None
+        self.buffered_bytes = 0
+        self.evicted_events = 0
+        self.dropped_events = 0
+        # (monotonic deadline, run id) of completed runs, soonest first
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._reaper: Optional["asyncio.Task[None]"] = None
+        self.expired_runs = 0
+        # Open streams per run; a run is not expired while it has any
+        self._subscribers: Dict[str, int] = {}
+
+    def waiter(self, run_id: str) -> "asyncio.Future[bool]":
+        """Future resolved on the run's next change, with True if it is a heartbeat instead
+
+        Take the waiter before reading events so a change in between is not missed.
+        """
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._tick(), name="sse-heartbeat")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(run_id, []).append(future)
+        return future
+
+    def subscribe(self, run_id: str) -> None:
+        """Count a stream reading the run, keeping it in memory past its retention"""
+        self._subscribers[run_id] = self._subscribers.get(run_id, 0) + 1
+
+    def unsubscribe(self, run_id: str) -> None:
+        """Release a stream taken with ``subscribe``"""
+        remaining = self._subscribers.get(run_id, 0) - 1
+        if remaining > 0:
+            self._subscribers[run_id] = remaining
+        else:
+            self._subscribers.pop(run_id, None)
+
+    def _wake(self, run_id: str, heartbeat: bool = False) -> None:
+        for future in self._waiters.pop(run_id, ()):
+            if not future.done():
+                future.set_result(heartbeat)
+
+    async def _tick(self) -> None:
+        """Wake every subscriber once per heartbeat interval, keeping idle connections alive
+
+        One shared ticker serves all runs, so idle streams cost no task of their own.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            for run_id in list(self._waiters):
+                self._wake(run_id, heartbeat=True)
+
+    async def wait(self, run_id: str) -> bool:
+        """Wait for the run's next change; True if woken by a heartbeat instead"""
+        future = self.waiter(run_id)
+        try:
+            return await future
+        finally:
+            self.discard_waiter(run_id, future)
+
+    def discard_waiter(self, run_id: str, future: "asyncio.Future[bool]") -> None:
+        """Forget a waiter whose subscriber went away"""
+        waiters = self._waiters.get(run_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiters[run_id]
 
-    def _cleanup_completed(self) -> None:
-        """Remove expired completed runs"""
-        now = datetime.utcnow()
-        expired = [rid for rid, data in self.completed_runs.items()
-                   if data.get("expires_at") and data["expires_at"] < now]
-        for rid in expired:
-            del self.completed_runs[rid]
+    def _publish(self, message: Dict[str, Any]) -> None:
+        if self.bus is not None:
+            self.bus.publish(message)
+
+    def _schedule_expiry(self, run_id: str, run_data: RunData) -> None:
+        """Queue a completed run for removal once its retention has passed
+
+        Deadlines sit in a heap drained by one background task, so lookups never
+        scan. Without a running loop, ``get_run_data`` drains due entries instead,
+        which costs a single peek when nothing is due.
+        """
+        deadline = time.monotonic() + self.retention_seconds
+        run_data["expires_at"] = datetime.utcnow() + timedelta(seconds=self.retention_seconds)
+        run_data["expiry_deadline"] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, run_id))
+        if self._reaper is None or self._reaper.done():
+            try:
+                self._reaper = asyncio.get_running_loop().create_task(self._reap(), name="run-expiry")
+            except RuntimeError:
+                # No loop (sync callers); lookups drain due entries instead
+                pass
+
+    def _expire_due(self) -> None:
+        """Remove completed runs whose deadline has passed"""
+        now = time.monotonic()
+        still_watched = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            deadline, run_id = heapq.heappop(self._expiry_heap)
+            run_data = self.completed_runs.get(run_id)
+            # Skip entries left behind by runs already removed or re-created
+            if run_data is None or run_data.get("expiry_deadline") != deadline:
+                continue
+            if self._subscribers.get(run_id):
+                still_watched.append((run_id, run_data))
+                continue
+            del self.completed_runs[run_id]
+            self._forget(run_id, run_data)
+            self.expired_runs += 1
+        # Runs with connected subscribers get another retention period
+        for run_id, run_data in still_watched:
+            self._schedule_expiry(run_id, run_data)
+
+    async def _reap(self) -> None:
+        """Sleep until the soonest deadline, expire what is due, repeat until the heap is empty"""
+        while self._expiry_heap:
+            await asyncio.sleep(max(self._expiry_heap[0][0] - time.monotonic(), 0))
+            self._expire_due()
+
+    def _forget(self, run_id: str, run_data: RunData) -> None:
+        """Release the memory and spilled events of a run leaving the manager"""
+        self.buffered_bytes -= run_data["bytes"]
+        if self.spill is not None and run_data["first_index"]:
+            self.spill.delete(run_id)
     
-    def create_run_data(self, run_id: str, thread_id: str, user_message: str) -> RunData:
+    def create_run_data(
+        self,
+        run_id: str,
+        thread_id: str,
+        user_message: str,
+        status: str = "running",
+        publish: bool = True
+    ) -> RunData:
         """Create initial run data structure"""
+        previous = self.active_runs.pop(run_id, None) or self.completed_runs.pop(run_id, None)
+        if previous is not None:
+            self._forget(run_id, previous)
         run_data = {
-            "status": "running",
+            "status": status,
             "events": [],
+            # Pre-encoded SSE frame of each buffered event, shared by all subscribers
+            "frames": [],
+            # Absolute index of events[0], and total size of the buffered frames
+            "first_index": 0,
+            "bytes": 0,
             "thread_id": thread_id,
             "user_message": user_message,
             "created_at": datetime.utcnow().isoformat()
         }
         self.active_runs[run_id] = run_data
+        self._wake(run_id)
+        if publish:
+            self._publish({
+                "kind": "create",
+                "run_id": run_id,
+                "thread_id": thread_id,
+                "user_message": user_message,
+                "status": status
+            })
         return run_data
     
+    def _store_event(self, run_id: str, event: RunEvent) -> bool:
+        """Buffer an event under an ``id`` equal to its index within the run
+
+        Past ``max_events_per_run`` events for the run, or about ``max_buffer_bytes``
+        for all runs, the oldest are evicted. Ids stay absolute across evictions.
+        """
+        run_data = self.active_runs.get(run_id) or self.completed_runs.get(run_id)
+        if run_data is None:
+            return False
+        next_id = run_data["first_index"] + len(run_data["events"])
+        if "id" not in event:
+            event["id"] = next_id
+        elif event["id"] > next_id:
+            # Mirroring a run joined midway or past lost messages: number it like its
+            # origin does. The buffer is read by position, so what it holds moves out first
+            if run_data["events"]:
+                self._evict(run_id, run_data, len(run_data["events"]))
+            run_data["first_index"] = event["id"]
+        # Encoded once here; every subscriber sends this same buffer
+        frame = event_frame(event)
+        size = len(frame)
+        run_data["events"].append(event)
+        run_data["frames"].append(frame)
+        run_data["bytes"] += size
+        self.buffered_bytes += size
+        if len(run_data["events"]) > self.max_events_per_run:
+            # Trim a quarter at a time so eviction cost is amortized over many events
+            self._evict(run_id, run_data, len(run_data["events"]) - self.max_events_per_run * 3 // 4)
+        if self.buffered_bytes > self.max_buffer_bytes:
+            self._enforce_budget()
+        self._wake(run_id)
+        return True
+
+    def _evict(self, run_id: str, run_data: RunData, count: int) -> None:
+        """Move a run's ``count`` oldest buffered events to ``spill``, or drop them without one"""
+        evicted = run_data["events"][:count]
+        if self.spill is None or not self.spill.append(run_id, evicted):
+            self.dropped_events += count
+        freed = sum(len(frame) for frame in run_data["frames"][:count])
+        del run_data["events"][:count]
+        del run_data["frames"][:count]
+        run_data["first_index"] += count
+        run_data["bytes"] -= freed
+        self.buffered_bytes -= freed
+        self.evicted_events += count
+
+    def _enforce_budget(self) -> None:
+        """Halve the largest buffers until all runs fit in ``max_buffer_bytes``"""
+        runs = {**self.completed_runs, **self.active_runs}
+        while self.buffered_bytes > self.max_buffer_bytes:
+            run_id, run_data = max(runs.items(), key=lambda item: item[1]["bytes"])
+            if len(run_data["events"]) <= 1:
+                break
+            self._evict(run_id, run_data, len(run_data["events"]) // 2)
+
     def add_event(self, run_id: str, event_type: str, data: Any) -> None:
-        """Add an event to a run"""
-        run_store = None
-        if run_id in self.active_runs:
-            run_store = self.active_runs
-        elif run_id in self.completed_runs:
-            run_store = self.completed_runs
-        if run_store is not None:
-            event = {
-                "event": event_type,
-                "data": data,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            run_store[run_id]["events"].append(event)
-
-    def update_status(self, run_id: str, status: str) -> None:
+        """Add an event to a run, handing it to ``log`` for a durable copy in the database"""
+        event = {
+            "event": event_type,
+            "data": data,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if self._store_event(run_id, event):
+            if self.log is not None:
+                self.log.append(run_id, event["id"], event)
+            self._publish({"kind": "event", "run_id": run_id, "event": event})
+
+    def update_status(self, run_id: str, status: str, publish: bool = True) -> None:
         """Update run status and move to completed storage when finished"""
         if run_id in self.active_runs:
             run_data = self.active_runs[run_id]
             run_data["status"] = status
             run_data["updated_at"] = datetime.utcnow().isoformat()
-            if status in ["completed", "failed"]:
-                run_data["expires_at"] = datetime.utcnow() + timedelta(seconds=self.retention_seconds)
+            if status in TERMINAL_STATUSES:
                 self.completed_runs[run_id] = run_data
+                self._schedule_expiry(run_id, run_data)
                 del self.active_runs[run_id]
         elif run_id in self.completed_runs:
             run_data = self.completed_runs[run_id]
             run_data["status"] = status
             run_data["updated_at"] = datetime.utcnow().isoformat()
+        else:
+            return
+        self._wake(run_id)
+        if publish and status in TERMINAL_STATUSES and self.log is not None:
+            # Make the finished run's history readable from the database promptly
+            self.log.flush_soon()
+        if publish:
+            self._publish({"kind": "status", "run_id": run_id, "status": status})
+
+    def apply_remote(self, message: Dict[str, Any]) -> None:
+        """Mirror a run change published by another process"""
+        run_id = message["run_id"]
+        if message["kind"] == "create":
+            self.create_run_data(
+                run_id, message["thread_id"], message["user_message"], message["status"], publish=False
+            )
+            return
+        if self.get_run_data(run_id) is None:
+            # Started before this process began listening; mirror from here on
+            self.create_run_data(run_id, None, "", publish=False)
+        if message["kind"] == "event":
+            self._store_event(run_id, message["event"])
+        elif message["kind"] == "status":
+            self.update_status(run_id, message["status"], publish=False)
     
     def get_run_data(self, run_id: str) -> Optional[RunData]:
         """Get run data by ID"""
-        self._cleanup_completed()
+        self._expire_due()
         return self.active_runs.get(run_id) or self.completed_runs.get(run_id)
 
     def cleanup_run(self, run_id: str) -> None:
         """Remove run data from memory"""
-        if run_id in self.active_runs:
-            del self.active_runs[run_id]
-        if run_id in self.completed_runs:
-            del self.completed_runs[run_id]
+        run_data = self.active_runs.pop(run_id, None) or self.completed_runs.pop(run_id, None)
+        if run_data is not None:
+            self._forget(run_id, run_data)
+        self._wake(run_id)
 
-    def get_events_since(self, run_id: str, last_index: int) -> List[RunEvent]:
-        """Get events since a specific index"""
+    async def get_events_since(self, run_id: str, last_index: int) -> List[RunEvent]:
+        """Get events since a specific index, reading evicted ones back from the spill"""
         run_data = self.get_run_data(run_id)
-        if run_data:
-            events = run_data["events"]
-            return events[last_index:]
-        return []
+        if not run_data:
+            return []
+        first_index = run_data["first_index"]
+        if last_index >= first_index:
+            return run_data["events"][last_index - first_index:]
+        # Taken before the read, which may overlap with new events and evictions
+        events = list(run_data["events"])
+        spilled = await self.spill.read(run_id, last_index, first_index) if self.spill is not None else []
+        return spilled + events
+
+    async def get_frames_since(self, run_id: str, last_index: int) -> List[bytes]:
+        """SSE frames of the events since an index; only events read back from the spill are encoded here"""
+        run_data = self.get_run_data(run_id)
+        if not run_data:
+            return []
+        first_index = run_data["first_index"]
+        if last_index >= first_index:
+            return run_data["frames"][last_index - first_index:]
+        # Taken before the read, which may overlap with new events and evictions
+        frames = list(run_data["frames"])
+        spilled = await self.spill.read(run_id, last_index, first_index) if self.spill is not None else []
+        return [event_frame(event) for event in spilled] + frames
+
+    def event_count(self, run_id: str) -> int:
+        """Index the run's next event will get"""
+        run_data = self.get_run_data(run_id)
+        if not run_data:
+            return 0
+        return run_data["first_index"] + len(run_data["events"])
+
+    def stats(self) -> Dict[str, Any]:
+        """Runs and event buffers held in memory, and subscribers waiting on them"""
+        runs = list(self.active_runs.values()) + list(self.completed_runs.values())
+        return {
+            "active_runs": len(self.active_runs),
+            "completed_runs": len(self.completed_runs),
+            "subscribers": sum(self._subscribers.values()),
+            "subscribers_waiting": sum(len(waiters) for waiters in self._waiters.values()),
+            "buffered_events": sum(len(run_data["events"]) for run_data in runs),
+            "buffered_bytes": self.buffered_bytes,
+            "max_buffer_bytes": self.max_buffer_bytes,
+            "largest_run_bytes": max((run_data["bytes"] for run_data in runs), default=0),
+            "expiry_queue": len(self._expiry_heap),
+            "expired_runs": self.expired_runs,
+            "evicted_events": self.evicted_events,
+            "dropped_events": self.dropped_events,
+            "spill": self.spill.stats() if self.spill is not None else None
+        }
 
 # Global run manager instance
 run_manager = RunManager()
@@ -104,39 +414,39 @@ def validate_role(role: str) -> bool:
     """Validate message role"""
     return role in ["user", "assistant", "system"]
 
-def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
     """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.scalar(select(User).where(User.id == user_id))
 
-def get_thread_by_id(db: Session, thread_id: str) -> Optional[Thread]:
+async def get_thread_by_id(db: AsyncSession, thread_id: str) -> Optional[Thread]:
     """Get thread by ID"""
-    return db.query(Thread).filter(Thread.id == thread_id).first()
+    return await db.scalar(select(Thread).where(Thread.id == thread_id))
 
-def get_run_by_id(db: Session, run_id: str) -> Optional[Run]:
+async def get_run_by_id(db: AsyncSession, run_id: str) -> Optional[Run]:
     """Get run by ID"""
-    return db.query(Run).filter(Run.id == run_id).first()
+    return await db.scalar(select(Run).where(Run.id == run_id))
 
-def get_thread_messages(db: Session, thread_id: str, limit: int = 50) -> List[Message]:
+async def get_thread_messages(db: AsyncSession, thread_id: str, limit: int = 50) -> List[Message]:
     """Get messages for a thread"""
-    return (
-        db.query(Message)
-        .filter(Message.thread_id == thread_id)
+    result = await db.scalars(
+        select(Message)
+        .where(Message.thread_id == thread_id)
         .order_by(Message.created_at.asc())
         .limit(limit)
-        .all()
     )
+    return list(result)
 
-def get_user_threads(db: Session, user_id: str, limit: int = 20) -> List[Thread]:
+async def get_user_threads(db: AsyncSession, user_id: str, limit: int = 20) -> List[Thread]:
     """Get threads for a user"""
-    return (
-        db.query(Thread)
-        .filter(Thread.user_id == user_id)
+    result = await db.scalars(
+        select(Thread)
+        .where(Thread.user_id == user_id)
         .order_by(desc(Thread.updated_at))
         .limit(limit)
-        .all()
     )
+    return list(result)
 
-def create_user_with_defaults(db: Session, user_id: Optional[str] = None) -> User:
+async def create_user_with_defaults(db: AsyncSession, user_id: Optional[str] = None) -> User:
     """Create a new user with default values"""
     user_id = user_id or generate_uuid()
     
@@ -149,11 +459,11 @@ def create_user_with_defaults(db: Session, user_id: Optional[str] = None) -> Use
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
-def create_thread_with_defaults(db: Session, user_id: str, title: Optional[str] = None) -> Thread:
+async def create_thread_with_defaults(db: AsyncSession, user_id: str, title: Optional[str] = None) -> Thread:
     """Create a new thread with default values"""
     thread = Thread(
         id=generate_uuid(),
@@ -164,27 +474,28 @@ def create_thread_with_defaults(db: Session, user_id: str, title: Optional[str]
     )
     
     db.add(thread)
-    db.commit()
-    db.refresh(thread)
+    await db.commit()
+    await db.refresh(thread)
     return thread
 
-def create_message_with_defaults(db: Session, thread_id: str, role: str, content: str) -> Message:
+async def create_message_with_defaults(db: AsyncSession, thread_id: str, role: str, content: str) -> Message:
     """Create a new message with default values"""
     message = Message(
         id=generate_uuid(),
         thread_id=thread_id,
         role=role,
         content=content,
+        token_count=count_tokens(content),
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow()
     )
     
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     return message
 
-def create_run_with_defaults(db: Session, thread_id: str, status: str = "queued") -> Run:
+async def create_run_with_defaults(db: AsyncSession, thread_id: str, status: str = "queued") -> Run:
     """Create a new run with default values"""
     run = Run(
         id=generate_uuid(),
@@ -195,21 +506,42 @@ def create_run_with_defaults(db: Session, thread_id: str, status: str = "queued"
     )
     
     db.add(run)
-    db.commit()
-    db.refresh(run)
+    await db.commit()
+    await db.refresh(run)
     return run
 
-def update_run_in_db(db: Session, run_id: str, status: str, result: Optional[str] = None) -> bool:
-    """Update run status and result in database"""
-    run = get_run_by_id(db, run_id)
-    if run:
-        run.status = status
-        if result is not None:
-            run.result = result
-        run.updated_at = datetime.utcnow()
-        db.commit()
-        return True
-    return False
+def _usage_columns() -> tuple:
+    """Aggregate expressions shared by the usage queries"""
+    return (
+        func.count(Run.id),
+        func.coalesce(func.sum(Run.prompt_tokens), 0),
+        func.coalesce(func.sum(Run.completion_tokens), 0),
+        func.coalesce(func.sum(Run.tokens_used), 0),
+    )
+
+def _format_usage(row: Any) -> Dict[str, int]:
+    """Turn a usage aggregate row into a response dict"""
+    runs, prompt_tokens, completion_tokens, tokens_used = row
+    return {
+        "runs": runs,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_used": tokens_used
+    }
+
+async def get_thread_usage(db: AsyncSession, thread_id: str) -> Dict[str, int]:
+    """Sum token usage over all runs of a thread"""
+    result = await db.execute(select(*_usage_columns()).where(Run.thread_id == thread_id))
+    return _format_usage(result.one())
+
+async def get_user_usage(db: AsyncSession, user_id: str) -> Dict[str, int]:
+    """Sum token usage over all runs in a user's threads"""
+    result = await db.execute(
+        select(*_usage_columns())
+        .join(Thread, Thread.id == Run.thread_id)
+        .where(Thread.user_id == user_id)
+    )
+    return _format_usage(result.one())
 
 def format_message_for_api(message: Message) -> Dict[str, Any]:
     """Format message for API response"""
@@ -238,27 +570,26 @@ def format_run_for_api(run: Run) -> Dict[str, Any]:
         "thread_id": run.thread_id,
         "status": run.status,
         "result": run.result,
+        "prompt_tokens": run.prompt_tokens,
+        "completion_tokens": run.completion_tokens,
+        "tokens_used": run.tokens_used,
         "created_at": run.created_at.isoformat() if run.created_at else None,
         "updated_at": run.updated_at.isoformat() if run.updated_at else None
     }
 
 async def wait_for_run_completion(run_id: str, timeout: int = 300) -> bool:
     """Wait for a run to complete with timeout"""
-    start_time = asyncio.get_event_loop().time()
-    
-    while True:
-        run_data = run_manager.get_run_data(run_id)
-        if not run_data:
-            return False
-        
-        if run_data["status"] in ["completed", "error"]:
-            return True
-        
-        # Check timeout
-        if asyncio.get_event_loop().time() - start_time > timeout:
-            return False
-        
-        await asyncio.sleep(0.1)
+    try:
+        async with asyncio.timeout(timeout):
+            while True:
+                run_data = run_manager.get_run_data(run_id)
+                if not run_data:
+                    return False
+                if run_data["status"] in TERMINAL_STATUSES:
+                    return True
+                await run_manager.wait(run_id)
+    except TimeoutError:
+        return False
 
 def sanitize_content(content: str, max_length: int = 10000) -> str:
     """Sanitize and truncate content"""
@@ -6,8 +6,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 from backend.api import router  # Fixed import
+from backend.api.scheduler import get_run_scheduler
+from backend.api.event_bus import get_event_bus
+from backend.api.event_spill import FileEventSpill
+from backend.api.event_log import RunEventWriter
+from backend.api.utils import run_manager
 from backend.config import get_settings  # Fixed import
-from backend.db.models import engine, Base  # Fixed import
+from backend.db.models import engine, async_engine, Base  # Fixed import
+from backend.http_clients import http_clients
+from backend.agent import conversation_cache
+from backend.agent.tools import get_tool_registry
+from backend.llm_cache import get_llm_cache
+from backend.tokens import count_tokens
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -30,6 +40,10 @@ logger.info(f"  COEXISTAI_BASE_URL: {settings.COEXISTAI_BASE_URL}")
 logger.info(f"  RUNNER_BASE_URL: {settings.RUNNER_BASE_URL}")
 logger.info(f"  MAX_ITERATIONS: {settings.MAX_ITERATIONS}")
 logger.info(f"  TIMEOUT_SECONDS: {settings.TIMEOUT_SECONDS}")
+logger.info(f"  MAX_CONCURRENT_RUNS: {settings.MAX_CONCURRENT_RUNS}")
+logger.info(f"  RUN_QUEUE_SIZE: {settings.RUN_QUEUE_SIZE}")
+logger.info(f"  EVENT_BUS_BACKEND: {settings.EVENT_BUS_BACKEND}")
+logger.info(f"  CONVERSATION_CACHE_ENABLED: {settings.CONVERSATION_CACHE_ENABLED}")
 logger.info(f"  CORS_ORIGINS: {settings.CORS_ORIGINS}")
 logger.info(f"  OPENAI_API_KEY: {'***' if settings.OPENAI_API_KEY else 'Not set'}")
 logger.info(f"  COEXISTAI_API_KEY: {'***' if settings.COEXISTAI_API_KEY else 'Not set'}")
@@ -95,6 +109,29 @@ async def bootstrap_database():
                     conn.commit()
                     print("Added 'result' column to runs table.")
 
+                # Ensure token usage columns exist in 'runs' table
+                col_result = conn.execute(text(
+                    """
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name = 'runs'
+                    """
+                ))
+                columns = {row[0] for row in col_result}
+
+                alter_statements = []
+                for column in ('prompt_tokens', 'completion_tokens'):
+                    if column not in columns:
+                        alter_statements.append(
+                            f"ALTER TABLE runs ADD COLUMN {column} INTEGER DEFAULT 0"
+                        )
+
+                for stmt in alter_statements:
+                    conn.execute(text(stmt))
+
+                if alter_statements:
+                    conn.commit()
+                    print("Added token usage columns to runs table.")
+
                 # Ensure 'title' column exists in 'threads' table
                 title_column = conn.execute(text(
                     "SELECT column_name FROM information_schema.columns "
@@ -105,6 +142,67 @@ async def bootstrap_database():
                     conn.commit()
                     print("Added 'title' column to threads table.")
 
+                # Ensure 'token_count' column exists in 'messages' table
+                token_count_column = conn.execute(text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_name='messages' AND column_name='token_count'"
+                )).fetchone()
+                if not token_count_column:
+                    conn.execute(text("ALTER TABLE messages ADD COLUMN token_count INTEGER"))
+                    conn.commit()
+                    print("Added 'token_count' column to messages table.")
+
+                # Backfill token counts of messages stored before they were counted
+                backfilled = 0
+                while True:
+                    rows = conn.execute(text(
+                        "SELECT id, content FROM messages WHERE token_count IS NULL LIMIT 1000"
+                    )).fetchall()
+                    if not rows:
+                        break
+                    conn.execute(
+                        text("UPDATE messages SET token_count = :token_count WHERE id = :id"),
+                        [{"id": row.id, "token_count": count_tokens(row.content)} for row in rows]
+                    )
+                    conn.commit()
+                    backfilled += len(rows)
+                if backfilled:
+                    print(f"Counted tokens of {backfilled} existing messages.")
+
+                # Ensure the runs status check allows 'timeout'
+                stale_checks = conn.execute(text(
+                    """
+                    SELECT conname FROM pg_constraint
+                    WHERE conrelid = 'runs'::regclass AND contype = 'c'
+                      AND pg_get_constraintdef(oid) LIKE '%status%'
+                      AND pg_get_constraintdef(oid) NOT LIKE '%timeout%'
+                    """
+                )).fetchall()
+                if stale_checks:
+                    for (conname,) in stale_checks:
+                        conn.execute(text(f'ALTER TABLE runs DROP CONSTRAINT "{conname}"'))
+                    conn.execute(text(
+                        "ALTER TABLE runs ADD CONSTRAINT check_run_status "
+                        "CHECK (status IN ('queued', 'running', 'completed', 'error', 'timeout'))"
+                    ))
+                    conn.commit()
+                    print("Added 'timeout' to the runs status check.")
+
+                # Ensure the run_events log table exists
+                conn.execute(text(
+                    """
+                    CREATE TABLE IF NOT EXISTS run_events (
+                        run_id UUID REFERENCES runs(id) ON DELETE CASCADE,
+                        seq INTEGER NOT NULL,
+                        event_type TEXT NOT NULL,
+                        data JSONB,
+                        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (run_id, seq)
+                    )
+                    """
+                ))
+                conn.commit()
+
                 # Ensure timestamp columns exist on threads table
                 col_result = conn.execute(text(
                     """
@@ -115,6 +213,10 @@ async def bootstrap_database():
                 columns = {row[0] for row in col_result}
 
                 alter_statements = []
+                if 'summary' not in columns:
+                    alter_statements.append("ALTER TABLE threads ADD COLUMN summary TEXT")
+                if 'summarized_until' not in columns:
+                    alter_statements.append("ALTER TABLE threads ADD COLUMN summarized_until TIMESTAMPTZ")
                 if 'created_at' not in columns:
                     alter_statements.append(
                         "ALTER TABLE threads ADD COLUMN created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP"
@@ -129,7 +231,7 @@ async def bootstrap_database():
 
                 if alter_statements:
                     conn.commit()
-                    print("Added missing timestamp columns to threads table.")
+                    print("Added missing summary/timestamp columns to threads table.")
 
                 # Ensure updated_at trigger exists for threads table
                 trigger_result = conn.execute(text(
@@ -252,8 +354,45 @@ async def bootstrap_database():
 
 @app.on_event("startup")
 async def startup_event():
-    """Run database bootstrap on startup"""
+    """Run database bootstrap, build the tool registry, open shared HTTP clients and start the event bus"""
     await bootstrap_database()
+    # Bootstrap is the only user of the sync engine
+    engine.dispose()
+    registry = get_tool_registry()
+    logger.info(f"Tool registry ready with {len(registry)} tools")
+    llm_cache = get_llm_cache()
+    if llm_cache:
+        logger.info(f"LLM cache enabled; pruned {llm_cache.prune()} expired entries")
+    await http_clients.startup()
+    run_manager.max_events_per_run = settings.RUN_EVENT_BUFFER_SIZE
+    run_manager.max_buffer_bytes = settings.RUN_EVENT_MEMORY_BYTES
+    if settings.RUN_EVENT_SPILL_DIR:
+        run_manager.spill = FileEventSpill(settings.RUN_EVENT_SPILL_DIR)
+    if settings.RUN_EVENT_LOG_ENABLED:
+        run_manager.log = RunEventWriter(
+            batch_size=settings.RUN_EVENT_LOG_BATCH_SIZE,
+            flush_interval=settings.RUN_EVENT_LOG_FLUSH_MS / 1000
+        )
+        await run_manager.log.start()
+    event_bus = get_event_bus()
+    run_manager.bus = event_bus
+    await event_bus.start(run_manager)
+    conversation_cache.enabled = settings.CONVERSATION_CACHE_ENABLED
+    if conversation_cache.enabled and settings.EVENT_BUS_BACKEND != "memory":
+        # Other processes write to the same threads without updating this cache
+        logger.warning("CONVERSATION_CACHE_ENABLED with a shared event bus: history may be stale across processes")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop scheduled runs and the event bus, flush the event log, then close HTTP clients and the database pool"""
+    await get_run_scheduler().shutdown()
+    await get_event_bus().stop()
+    if run_manager.log is not None:
+        await run_manager.log.stop()
+    if run_manager.spill is not None:
+        await run_manager.spill.stop()
+    await http_clients.shutdown()
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -1,5 +1,29 @@
 """Database Package"""
 
-from .models import User, Thread, Message, Run, Artifact, get_db, SessionLocal
+from .models import (
+    User,
+    Thread,
+    Message,
+    Run,
+    RunEventRecord,
+    Artifact,
+    get_db,
+    get_async_db,
+    SessionLocal,
+    AsyncSessionLocal,
+    async_engine,
+)
 
-__all__ = ["User", "Thread", "Message", "Run", "Artifact", "get_db", "SessionLocal"]
\ No newline at end of file
+__all__ = [
+    "User",
+    "Thread",
+    "Message",
+    "Run",
+    "RunEventRecord",
+    "Artifact",
+    "get_db",
+    "get_async_db",
+    "SessionLocal",
+    "AsyncSessionLocal",
+    "async_engine",
+]
\ No newline at end of file
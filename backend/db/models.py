@@ -1,22 +1,44 @@
 from sqlalchemy import create_engine, Column, String, Text, Integer, ForeignKey, DateTime, CheckConstraint
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from datetime import datetime
 import uuid
-from typing import Optional, List, Dict, Any
+from typing import AsyncIterator, Optional, List, Dict, Any
 from backend.config import get_settings  # Fixed import
+from backend.db.pool import InstrumentedAsyncPool, pool_metrics
 
 # Get settings
 settings = get_settings()
 
 Base = declarative_base()
 
-# Database engine and session
+def make_async_url(url: str) -> str:
+    """Point a Postgres URL at the asyncpg driver"""
+    scheme, sep, rest = url.partition("://")
+    if scheme.split("+")[0] in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+# Sync engine and session, used for schema bootstrap at startup
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session for request handlers and agent runs
+async_engine = create_async_engine(
+    make_async_url(settings.DATABASE_URL),
+    poolclass=InstrumentedAsyncPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+pool_metrics.slow_checkout_seconds = settings.DB_SLOW_CHECKOUT_SECONDS
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -25,6 +47,15 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Occupancy and checkout wait metrics of the async engine's pool"""
+    return pool_metrics.stats(async_engine.pool)
+
 class User(Base):
     """User model"""
     __tablename__ = 'users'
@@ -48,6 +79,9 @@ class Thread(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'))
     title = Column(Text)
+    # Rolling summary of older messages, and the created_at of the newest one folded in
+    summary = Column(Text)
+    summarized_until = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -68,6 +102,8 @@ class Message(Base):
     thread_id = Column(UUID(as_uuid=True), ForeignKey('threads.id', ondelete='CASCADE'), nullable=False)
     role = Column(Text, nullable=False)
     content = Column(JSONB, nullable=False)
+    # Content token count, computed once at write time for context budgeting
+    token_count = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -90,13 +126,15 @@ class Run(Base):
     thread_id = Column(UUID(as_uuid=True), ForeignKey('threads.id', ondelete='CASCADE'), nullable=False)
     status = Column(Text, nullable=False)
     tokens_used = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
     result = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Add check constraint for status
     __table_args__ = (
-        CheckConstraint("status IN ('queued', 'running', 'completed', 'error')", name='check_run_status'),
+        CheckConstraint("status IN ('queued', 'running', 'completed', 'error', 'timeout')", name='check_run_status'),
     )
     
     # Relationships
@@ -105,6 +143,20 @@ class Run(Base):
     def __repr__(self):
         return f"<Run(id={self.id}, status='{self.status}')>"
 
+class RunEventRecord(Base):
+    """Durable copy of an event streamed by a run"""
+    __tablename__ = 'run_events'
+    
+    run_id = Column(UUID(as_uuid=True), ForeignKey('runs.id', ondelete='CASCADE'), primary_key=True)
+    # Position of the event within its run, as numbered by the run manager
+    seq = Column(Integer, primary_key=True)
+    event_type = Column(Text, nullable=False)
+    data = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<RunEventRecord(run_id={self.run_id}, seq={self.seq})>"
+
 class Artifact(Base):
     """Artifact model"""
     __tablename__ = 'artifacts'
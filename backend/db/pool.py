@@ -0,0 +1,130 @@
+"""Connection pool instrumentation for the async Postgres engine"""
+
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the checkout wait histogram buckets, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def describe_holder() -> str:
+    """Name the code path of the current task, for attributing checkouts
+
+    Inside SQLAlchemy's greenlet bridge the Python stack stops at the bridge,
+    so the frames come from the awaiting task's coroutine chain instead.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is None:
+        return "<no task>"
+    frames = [
+        frame for frame in task.get_stack()
+        if "/backend/" in frame.f_code.co_filename and not frame.f_code.co_filename.endswith("db/pool.py")
+    ]
+    if not frames:
+        return task.get_name()
+    frame = frames[-1]
+    filename = frame.f_code.co_filename.split("/backend/", 1)[-1]
+    return f"{task.get_name()} backend/{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+class PoolMetrics:
+    """Checkout counters, wait histogram and current holders of pooled connections"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.wait_buckets: List[int] = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        # Log checkouts that waited at least this long; 0 disables holder tracking
+        self.slow_checkout_seconds = 0.0
+        self.slow_checkouts = 0
+        self._holders: Dict[int, Tuple[str, float]] = {}
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+
+    def hold(self, record: Any) -> None:
+        if self.slow_checkout_seconds > 0:
+            self._holders[id(record)] = (describe_holder(), time.monotonic())
+
+    def release(self, record: Any) -> None:
+        self._holders.pop(id(record), None)
+
+    def holders(self) -> List[Tuple[str, float]]:
+        """Code paths holding connections and for how long, longest first"""
+        now = time.monotonic()
+        held = [(holder, now - since) for holder, since in self._holders.values()]
+        return sorted(held, key=lambda item: item[1], reverse=True)
+
+    def report_slow(self, waited: float, timed_out: bool = False) -> None:
+        """Log a slow or failed checkout along with who holds the connections"""
+        self.slow_checkouts += 1
+        holders = "; ".join(f"{holder} ({held:.2f}s)" for holder, held in self.holders()) or "none tracked"
+        outcome = "timed out" if timed_out else "succeeded"
+        logger.warning(
+            f"DB pool checkout by {describe_holder()} {outcome} after {waited:.3f}s; "
+            f"connections held by: {holders}"
+        )
+
+    def stats(self, pool: Optional[Any] = None) -> Dict[str, Any]:
+        """Pool occupancy plus checkout wait statistics"""
+        labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + ["gt_5000ms"]
+        stats = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "slow_checkouts": self.slow_checkouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "wait_histogram": dict(zip(labels, self.wait_buckets)),
+        }
+        if pool is not None:
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "idle": pool.checkedin(),
+            })
+        return stats
+
+
+# Process-wide metrics; module level so they survive pool recreation on dispose
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that times every checkout and remembers who holds each connection"""
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            waited = time.perf_counter() - started
+            pool_metrics.timeouts += 1
+            pool_metrics.report_slow(waited, timed_out=True)
+            raise
+        waited = time.perf_counter() - started
+        pool_metrics.record_wait(waited)
+        if 0 < pool_metrics.slow_checkout_seconds <= waited:
+            pool_metrics.report_slow(waited)
+        pool_metrics.hold(record)
+        return record
+
+    def _do_return_conn(self, record: Any) -> None:
+        pool_metrics.release(record)
+        super()._do_return_conn(record)
@@ -0,0 +1,45 @@
+"""Run-level deadlines that bound every upstream await"""
+
+import asyncio
+import time
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class RunTimeout(Exception):
+    """Raised when a run's deadline passes while it is waiting on an upstream"""
+
+
+class Deadline:
+    """A fixed point in time by which a run must finish
+
+    Each bounded await runs under ``asyncio.timeout`` for whatever time is
+    left, so an expired deadline cancels the in-flight call in its own task.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Await ``awaitable``, cancelling it and raising ``RunTimeout`` once the deadline passes"""
+        if self.expired:
+            # Don't leave a never-awaited coroutine behind
+            close = getattr(awaitable, "close", None)
+            if close is not None:
+                close()
+            raise RunTimeout(f"Run exceeded its {self.seconds}s deadline")
+        try:
+            async with asyncio.timeout(self.remaining()):
+                return await awaitable
+        except TimeoutError:
+            raise RunTimeout(f"Run exceeded its {self.seconds}s deadline") from None
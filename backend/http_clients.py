@@ -0,0 +1,128 @@
+"""Shared, pooled HTTP clients for upstream services (LLM, CoexistAI, Runner)"""
+
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from backend.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Upstream name -> (settings attribute holding the pool size, default timeout)
+UPSTREAMS: Dict[str, Any] = {
+    "openai": ("OPENAI_MAX_CONNECTIONS", 60.0),
+    "coexistai": ("COEXISTAI_MAX_CONNECTIONS", 30.0),
+    "runner": ("RUNNER_MAX_CONNECTIONS", 60.0),
+}
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper counting new versus reused pooled connections"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "errors": 0,
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Send a request, using httpcore's trace hook to spot new connections"""
+        opened = False
+        parent_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal opened
+            # Only fires when the pool has to dial a fresh TCP connection
+            if event_name == "connection.connect_tcp.started":
+                opened = True
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats["requests"] += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            if opened:
+                self.stats["new_connections"] += 1
+            else:
+                self.stats["reused_connections"] += 1
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class HTTPClientRegistry:
+    """App-scoped registry of pooled ``httpx.AsyncClient`` instances, one per upstream"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, InstrumentedTransport] = {}
+
+    def _http2_available(self) -> bool:
+        """HTTP/2 needs the optional ``h2`` package"""
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _build_client(self, name: str) -> httpx.AsyncClient:
+        """Create a pooled client for an upstream using the configured limits"""
+        settings = get_settings()
+        pool_size_setting, timeout = UPSTREAMS[name]
+
+        http2 = settings.HTTP2_ENABLED
+        if http2 and not self._http2_available():
+            logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing; using HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=getattr(settings, pool_size_setting),
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        transport = InstrumentedTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2))
+        self._transports[name] = transport
+
+        logger.info(f"Created HTTP client for {name} (max_connections={limits.max_connections}, http2={http2})")
+        return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Get the shared client for an upstream, creating it on first use"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build_client(name)
+            self._clients[name] = client
+        return client
+
+    async def startup(self) -> None:
+        """Create clients for all known upstreams"""
+        for name in UPSTREAMS:
+            self.get(name)
+
+    async def shutdown(self) -> None:
+        """Close every client and its connection pool"""
+        for name, client in list(self._clients.items()):
+            await client.aclose()
+            logger.info(f"Closed HTTP client for {name}")
+        self._clients.clear()
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Connection reuse counters, per upstream or for a single one"""
+        if name is not None:
+            transport = self._transports.get(name)
+            return dict(transport.stats) if transport else {}
+        return {upstream: dict(transport.stats) for upstream, transport in self._transports.items()}
+
+
+# Global registry instance
+http_clients = HTTPClientRegistry()
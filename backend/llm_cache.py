@@ -0,0 +1,171 @@
+"""Content-addressed cache of chat completion responses"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Response fields worth replaying; usage is dropped since a hit costs no tokens
+CACHED_FIELDS = ("content", "tool_calls")
+
+
+class LLMResponseCache:
+    """In-memory LRU in front of an optional on-disk store, with TTL expiry
+
+    Entries are keyed by a SHA-256 of the canonical request payload, so
+    identical ``(model, messages, tools)`` requests share one entry.
+    """
+
+    def __init__(self, directory: Optional[str], ttl_seconds: float, max_entries: int = 1024):
+        self.directory = Path(directory) if directory else None
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.saved_latency_seconds = 0.0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], tools_json: str) -> str:
+        """Stable hash of a request payload"""
+        canonical = json.dumps(
+            {"model": model, "messages": messages},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        digest = hashlib.sha256()
+        digest.update(canonical.encode())
+        digest.update(tools_json.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["stored_at"] < self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._is_fresh(entry):
+            path.unlink(missing_ok=True)
+            self.expired += 1
+            return None
+        return entry
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None and not self._is_fresh(entry):
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+        elif self.directory is not None:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry is not None:
+                self._remember(key, entry)
+                self.disk_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.saved_latency_seconds += entry["latency"]
+        return dict(entry["response"])
+
+    async def put(self, key: str, response: Dict[str, Any], latency: float) -> None:
+        """Store a response along with the latency it took to produce"""
+        entry = {
+            "response": {field: response.get(field) for field in CACHED_FIELDS},
+            "latency": latency,
+            "stored_at": time.time(),
+        }
+        self._remember(key, entry)
+        self.stores += 1
+        if self.directory is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, entry)
+            except OSError as e:
+                logger.warning(f"Failed to persist LLM cache entry: {e}")
+
+    def prune(self) -> int:
+        """Delete expired entries from memory and disk, returning how many were removed"""
+        removed = 0
+        for key in [key for key, entry in self._entries.items() if not self._is_fresh(entry)]:
+            del self._entries[key]
+            removed += 1
+        if self.directory is not None and self.directory.exists():
+            cutoff = time.time() - self.ttl_seconds
+            for path in self.directory.glob("*/*.json"):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        self.expired += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and latency saved by serving responses from the cache"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "expired": self.expired,
+            "saved_latency_seconds": round(self.saved_latency_seconds, 3),
+        }
+
+
+@lru_cache()
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get the process-wide response cache, or None when caching is disabled"""
+    settings = get_settings()
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return LLMResponseCache(
+        directory=settings.LLM_CACHE_DIR or None,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    )
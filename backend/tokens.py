@@ -0,0 +1,37 @@
+"""Token counting for prompt budgeting"""
+
+import json
+import logging
+import math
+from functools import lru_cache
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache()
+def _get_encoding() -> Optional[Any]:
+    """Load the tiktoken encoding if the optional package is installed"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken not installed; estimating token counts from text length")
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(content: Any) -> int:
+    """Count tokens in message content (strings, or JSON-serializable values)"""
+    if content is None:
+        return 0
+    text = content if isinstance(content, str) else json.dumps(content)
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
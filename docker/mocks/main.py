@@ -0,0 +1,280 @@
+"""Local stand-ins for the LLM, CoexistAI and Runner upstreams, for offline load testing
+
+One process serves all three APIs, so the backend can point OPENAI_BASE_URL,
+COEXISTAI_BASE_URL and RUNNER_BASE_URL at the same address:
+
+    OPENAI_BASE_URL=http://localhost:9000/v1
+    COEXISTAI_BASE_URL=http://localhost:9000
+    RUNNER_BASE_URL=http://localhost:9000
+
+Behaviour is configured per upstream (LLM, SEARCH, BROWSE) with environment
+variables:
+
+    MOCK_<UPSTREAM>_LATENCY_MS         mean response latency (default 200/300/800)
+    MOCK_<UPSTREAM>_LATENCY_JITTER_MS  spread around the mean (default 50/100/300)
+    MOCK_<UPSTREAM>_ERROR_RATE         fraction of requests failing with HTTP 500
+    MOCK_<UPSTREAM>_PAYLOAD_BYTES      approximate size of the generated text
+
+plus these global and LLM-specific settings:
+
+    MOCK_LATENCY_DISTRIBUTION  fixed | uniform | normal | exponential (default normal)
+    MOCK_LLM_TOOL_CALL_RATE    chance a user turn is answered with a web_search call
+    MOCK_LLM_TOKEN_DELAY_MS    delay between streamed chunks (default 20)
+    MOCK_SEED                  seed for reproducible runs
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "agent search result context model token stream latency browser page "
+    "summary answer query source python data system network request"
+).split()
+
+
+class UpstreamProfile(BaseModel):
+    """Latency, error and payload settings for one mocked upstream"""
+    latency_ms: float
+    jitter_ms: float
+    error_rate: float = 0.0
+    payload_bytes: int
+
+    @classmethod
+    def from_env(cls, name: str, latency_ms: float, jitter_ms: float, payload_bytes: int) -> "UpstreamProfile":
+        prefix = f"MOCK_{name}_"
+        return cls(
+            latency_ms=float(os.getenv(f"{prefix}LATENCY_MS", latency_ms)),
+            jitter_ms=float(os.getenv(f"{prefix}LATENCY_JITTER_MS", jitter_ms)),
+            error_rate=float(os.getenv(f"{prefix}ERROR_RATE", 0.0)),
+            payload_bytes=int(os.getenv(f"{prefix}PAYLOAD_BYTES", payload_bytes)),
+        )
+
+
+LLM = UpstreamProfile.from_env("LLM", 200, 50, 400)
+SEARCH = UpstreamProfile.from_env("SEARCH", 300, 100, 600)
+BROWSE = UpstreamProfile.from_env("BROWSE", 800, 300, 5000)
+DISTRIBUTION = os.getenv("MOCK_LATENCY_DISTRIBUTION", "normal")
+TOOL_CALL_RATE = float(os.getenv("MOCK_LLM_TOOL_CALL_RATE", 0.5))
+TOKEN_DELAY_MS = float(os.getenv("MOCK_LLM_TOKEN_DELAY_MS", 20))
+
+rng = random.Random(os.getenv("MOCK_SEED"))
+stats: Dict[str, int] = {"llm": 0, "search": 0, "browse": 0, "errors": 0}
+
+app = FastAPI(title="Mock Upstreams", version="1.0.0")
+
+
+def sample_latency(profile: UpstreamProfile) -> float:
+    """Draw a latency in seconds from the configured distribution"""
+    mean, jitter = profile.latency_ms, profile.jitter_ms
+    if DISTRIBUTION == "fixed":
+        value = mean
+    elif DISTRIBUTION == "uniform":
+        value = rng.uniform(mean - jitter, mean + jitter)
+    elif DISTRIBUTION == "exponential":
+        value = rng.expovariate(1 / mean) if mean > 0 else 0.0
+    else:
+        value = rng.gauss(mean, jitter)
+    return max(value, 0.0) / 1000
+
+
+def generate_text(size: int) -> str:
+    """Filler text of roughly ``size`` bytes"""
+    words: List[str] = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+async def simulate(profile: UpstreamProfile, counter: str) -> Optional[JSONResponse]:
+    """Sleep for a sampled latency and maybe fail; returns an error response on failure"""
+    stats[counter] += 1
+    await asyncio.sleep(sample_latency(profile))
+    if rng.random() < profile.error_rate:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": f"mock {counter} failure"})
+    return None
+
+
+def plan_completion(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Decide what the mock model says: a web_search call or plain text"""
+    messages = payload.get("messages") or []
+    last = messages[-1] if messages else {}
+    tool_names = {tool["function"]["name"] for tool in payload.get("tools") or []}
+
+    if last.get("role") == "user" and "web_search" in tool_names and rng.random() < TOOL_CALL_RATE:
+        query = last.get("content") if isinstance(last.get("content"), str) else "query"
+        return {
+            "content": "",
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+                "type": "function",
+                "function": {"name": "web_search", "arguments": json.dumps({"query": query})}
+            }]
+        }
+    return {"content": generate_text(LLM.payload_bytes), "tool_calls": []}
+
+
+def estimate_usage(payload: Dict[str, Any], completion: Dict[str, Any]) -> Dict[str, int]:
+    """Rough token usage, at ~4 characters per token"""
+    prompt_tokens = len(json.dumps(payload.get("messages") or [])) // 4
+    completion_tokens = len(json.dumps(completion)) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def stream_completion(
+    model: str,
+    completion: Dict[str, Any],
+    usage: Optional[Dict[str, int]]
+) -> AsyncIterator[str]:
+    """Emit a completion as OpenAI-style SSE chunks"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    yield chunk({"role": "assistant"})
+    words = completion["content"].split(" ") if completion["content"] else []
+    for position, word in enumerate(words):
+        await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+        yield chunk({"content": word if position == 0 else f" {word}"})
+
+    for index, call in enumerate(completion["tool_calls"]):
+        arguments = call["function"]["arguments"]
+        half = len(arguments) // 2
+        # Split arguments across two deltas, like the real API does
+        yield chunk({"tool_calls": [{
+            "index": index,
+            "id": call["id"],
+            "type": "function",
+            "function": {"name": call["function"]["name"], "arguments": arguments[:half]}
+        }]})
+        await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+        yield chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[half:]}}]})
+
+    yield chunk({}, "tool_calls" if completion["tool_calls"] else "stop")
+    if usage is not None:
+        yield f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.api_route("/health", methods=["GET", "HEAD"])
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy", "service": "mock-upstreams"}
+
+
+@app.get("/stats")
+async def get_stats():
+    """Request and error counters"""
+    return stats
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """OpenAI Chat Completions, with or without streaming"""
+    payload = await request.json()
+    error = await simulate(LLM, "llm")
+    if error is not None:
+        return error
+
+    model = payload.get("model", "mock")
+    completion = plan_completion(payload)
+    usage = estimate_usage(payload, completion)
+
+    if payload.get("stream"):
+        include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+        return StreamingResponse(
+            stream_completion(model, completion, usage if include_usage else None),
+            media_type="text/event-stream"
+        )
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": completion["content"] or None,
+                **({"tool_calls": completion["tool_calls"]} if completion["tool_calls"] else {})
+            },
+            "finish_reason": "tool_calls" if completion["tool_calls"] else "stop"
+        }],
+        "usage": usage
+    }
+
+
+@app.post("/web-search")
+async def web_search(request: Request):
+    """CoexistAI web search"""
+    payload = await request.json()
+    error = await simulate(SEARCH, "search")
+    if error is not None:
+        return error
+
+    query = payload.get("query", "")
+    top_k = int(payload.get("top_k", 5))
+    snippet_size = max(SEARCH.payload_bytes // max(top_k, 1), 1)
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Mock result {rank + 1} for {query}",
+                "url": f"http://mock.local/{rank + 1}",
+                "snippet": generate_text(snippet_size)
+            }
+            for rank in range(top_k)
+        ]
+    }
+
+
+@app.post("/browse")
+async def browse(request: Request):
+    """Runner page extraction"""
+    payload = await request.json()
+    error = await simulate(BROWSE, "browse")
+    if error is not None:
+        return error
+
+    url = payload.get("url", "")
+    return {
+        "title": f"Mock page for {url}",
+        "text": generate_text(BROWSE.payload_bytes),
+        "url": url,
+        "success": True
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("MOCK_PORT", 9000)))
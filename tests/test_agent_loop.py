@@ -0,0 +1,290 @@
+import asyncio
+import gc
+import importlib.util
+import json
+import sys
+import time
+import types
+from pathlib import Path
+
+import httpx
+
+
+def _load_module(monkeypatch, name, path, **kwargs):
+    spec = importlib.util.spec_from_file_location(name, Path(path), **kwargs)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _load_loop_module(monkeypatch, handler=None, **settings):
+    """Load the agent loop against stubbed settings, database and OpenAI client
+
+    ``handler`` serves the OpenAI requests through an ``httpx.MockTransport``.
+    """
+    settings = types.SimpleNamespace(**{
+        "OPENAI_API_KEY": "test-key",
+        "OPENAI_BASE_URL": "http://openai.test/v1",
+        "OPENAI_STREAMING": True,
+        "SPECULATIVE_SEARCH_ENABLED": False,
+        "TIMEOUT_SECONDS": 30.0,
+        "CONTEXT_TOKEN_BUDGET": 3000,
+        **settings,
+    })
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler or (lambda request: httpx.Response(500))))
+    stubs = {
+        "backend.config": types.SimpleNamespace(get_settings=lambda: settings),
+        "backend.http_clients": types.SimpleNamespace(http_clients=types.SimpleNamespace(get=lambda name: client)),
+        "backend.llm_cache": types.SimpleNamespace(LLMResponseCache=object, get_llm_cache=lambda: None),
+        "backend.db": types.SimpleNamespace(AsyncSessionLocal=None),
+        "backend.db.models": types.SimpleNamespace(Thread=None, Message=None),
+        "backend.agent.memory": types.SimpleNamespace(conversation_cache=None),
+        "backend.agent.persistence": types.SimpleNamespace(RunUnitOfWork=None),
+        "backend.agent.summary": types.SimpleNamespace(SUMMARY_HEADER=""),
+    }
+    backend_agent = types.ModuleType("backend.agent")
+    backend_agent.__path__ = [str(Path("backend/agent"))]
+    stubs["backend.agent"] = backend_agent
+    for name, stub in stubs.items():
+        monkeypatch.setitem(sys.modules, name, stub)
+    for name in ("backend.agent.tools.web_search", "backend.agent.tools.browser"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    _load_module(monkeypatch, "backend.deadline", "backend/deadline.py")
+    _load_module(
+        monkeypatch,
+        "backend.agent.tools",
+        "backend/agent/tools/__init__.py",
+        submodule_search_locations=[str(Path("backend/agent/tools"))],
+    )
+    return _load_module(monkeypatch, "backend.agent.loop", "backend/agent/loop.py")
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_deadline_bounds_a_stream_that_never_sends_headers(monkeypatch):
+    async def slow_headers(request):
+        await asyncio.sleep(3)
+        return httpx.Response(200, text="data: [DONE]\n\n")
+
+    loop_module = _load_loop_module(monkeypatch, slow_headers)
+    deadline = sys.modules["backend.deadline"].Deadline(0.3)
+    agent = loop_module.AgentLoop(registry=loop_module.ToolRegistry([]), deadline=deadline)
+
+    started = time.monotonic()
+    events = asyncio.run(_collect(agent._execute_agent_loop([{"role": "user", "content": "hi"}], use_cache=False)))
+    elapsed = time.monotonic() - started
+
+    assert 0.25 < elapsed < 1.0
+    assert events[-1]["type"] == "message" and events[-1]["timed_out"]
+    assert events[-1]["content"] == loop_module.TIMEOUT_MESSAGE
+
+
+def _make_tool(loop_module, name, run, max_concurrency=4):
+    class FakeTool(loop_module.BaseTool):
+        def _get_description(self):
+            return name
+
+        def _get_schema(self):
+            return {"type": "function", "function": {"name": name, "parameters": {}}}
+
+        async def __call__(self, **kwargs):
+            return loop_module.ToolResult(name=name, ok=True, data=await run(**kwargs))
+
+    FakeTool.max_concurrency = max_concurrency
+    return FakeTool(name)
+
+
+def _tool_call(call_id, name, arguments="{}"):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+
+
+def test_tool_messages_keep_request_order_when_results_finish_out_of_order(monkeypatch):
+    requests = []
+
+    def chat(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if len(requests) == 1:
+            message = {"content": "", "tool_calls": [_tool_call("slow-call", "slow"), _tool_call("fast-call", "fast")]}
+        else:
+            message = {"content": "done"}
+        return httpx.Response(200, json={"choices": [{"message": message}]})
+
+    loop_module = _load_loop_module(monkeypatch, chat, OPENAI_STREAMING=False)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "slow result"
+
+    async def fast():
+        return "fast result"
+
+    registry = loop_module.ToolRegistry([_make_tool(loop_module, "slow", slow), _make_tool(loop_module, "fast", fast)])
+    agent = loop_module.AgentLoop(registry=registry)
+    events = asyncio.run(_collect(agent._execute_agent_loop([{"role": "user", "content": "hi"}], use_cache=False)))
+
+    assert [e["tool_call_id"] for e in events if e["type"] == "tool_result"] == ["fast-call", "slow-call"]
+    tool_messages = [m for m in requests[1]["messages"] if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_messages] == ["slow-call", "fast-call"]
+    assert events[-1] == {"type": "message", "content": "done", "streamed": False, "usage": events[-1]["usage"]}
+
+
+def test_tool_semaphore_caps_concurrent_calls(monkeypatch):
+    loop_module = _load_loop_module(monkeypatch)
+    active = []
+    peak = []
+
+    async def capped():
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.pop()
+        return "ok"
+
+    registry = loop_module.ToolRegistry([_make_tool(loop_module, "capped", capped, max_concurrency=2)])
+    agent = loop_module.AgentLoop(registry=registry)
+    calls = [_tool_call(f"call-{i}", "capped") for i in range(6)]
+
+    async def scenario():
+        return [index async for index, _ in agent._execute_tool_calls(calls)]
+
+    assert sorted(asyncio.run(scenario())) == list(range(6))
+    assert max(peak) == 2
+
+
+def test_pending_tool_calls_are_cancelled_when_the_consumer_stops(monkeypatch):
+    loop_module = _load_loop_module(monkeypatch)
+    cancelled = []
+
+    async def quick():
+        return "ok"
+
+    async def stuck():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    registry = loop_module.ToolRegistry([_make_tool(loop_module, "quick", quick), _make_tool(loop_module, "stuck", stuck)])
+    agent = loop_module.AgentLoop(registry=registry)
+    calls = [_tool_call("stuck-1", "stuck"), _tool_call("quick", "quick"), _tool_call("stuck-2", "stuck")]
+
+    async def scenario():
+        results = agent._execute_tool_calls(calls)
+        index, result = await anext(results)
+        await results.aclose()
+        # Let the cancellations be delivered, before asyncio.run would cancel leftovers itself
+        await asyncio.sleep(0)
+        return index, result, list(cancelled)
+
+    index, result, cancelled_before_exit = asyncio.run(scenario())
+    assert index == 1 and result.data == "ok"
+    assert cancelled_before_exit == [True, True]
+
+
+def test_stream_parser_stitches_tool_call_fragments_and_reads_trailing_usage(monkeypatch):
+    chunks = [
+        {"choices": [{"delta": {"role": "assistant", "content": "Let me "}}]},
+        {"choices": [{"delta": {"content": "check."}}]},
+        {"choices": [{"delta": {"tool_calls": [
+            {"index": 0, "id": "call_a", "type": "function", "function": {"name": "web_", "arguments": ""}},
+        ]}}]},
+        {"choices": [{"delta": {"tool_calls": [
+            {"index": 0, "function": {"name": "search", "arguments": "{\"query\": "}},
+            {"index": 1, "id": "call_b", "type": "function", "function": {"name": "browser", "arguments": "{\"url\""}},
+        ]}}]},
+        {"choices": [{"delta": {"tool_calls": [
+            {"index": 1, "function": {"arguments": ": \"https://example.com\"}"}},
+            {"index": 0, "function": {"arguments": "\"weather\"}"}},
+        ]}}]},
+        {"choices": [{"delta": {}, "finish_reason": "tool_calls"}]},
+        # With stream_options.include_usage the usage arrives in a final chunk without choices
+        {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 7, "total_tokens": 19}},
+    ]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + ": keep-alive\n\ndata: [DONE]\n\n"
+    loop_module = _load_loop_module(monkeypatch, lambda request: httpx.Response(200, text=body))
+    agent = loop_module.AgentLoop(registry=loop_module.ToolRegistry([]))
+
+    events = asyncio.run(_collect(agent._stream_openai_api([{"role": "user", "content": "weather?"}])))
+
+    assert [e["content"] for e in events if e["type"] == "token"] == ["Let me ", "check."]
+    response = events[-1]
+    assert response["type"] == "response" and response["content"] == "Let me check."
+    assert response["tool_calls"] == [
+        {"id": "call_a", "type": "function", "function": {"name": "web_search", "arguments": "{\"query\": \"weather\"}"}},
+        {"id": "call_b", "type": "function", "function": {"name": "browser", "arguments": "{\"url\": \"https://example.com\"}"}},
+    ]
+    assert response["usage"] == {"prompt_tokens": 12, "completion_tokens": 7, "total_tokens": 19}
+
+
+def test_speculative_search_is_claimed_or_discarded(monkeypatch):
+    loop_module = _load_loop_module(monkeypatch, SPECULATIVE_SEARCH_ENABLED=True)
+    stats = loop_module.speculation_stats
+    searches = []
+
+    async def web_search(query):
+        searches.append(query)
+        return {"results": [query]}
+
+    agent = loop_module.AgentLoop(registry=loop_module.ToolRegistry([_make_tool(loop_module, "web_search", web_search)]))
+
+    async def scenario():
+        # The model asks for the same search, so the prefetch is handed over
+        hit = agent._start_speculative_search([{"role": "user", "content": "Search the  weather"}])
+        claimed = hit.claim([_tool_call("other", "browser"), _tool_call("call", "web_search", '{"query": "search the weather"}')])
+        hit.discard()
+        assert list(claimed) == [1]
+        assert (await claimed[1]).data == {"results": ["Search the  weather"]}
+
+        # A different query leaves the prefetch unclaimed and it is cancelled
+        miss = agent._start_speculative_search([{"role": "user", "content": "find cats"}])
+        assert miss.claim([_tool_call("call", "web_search", '{"query": "dogs"}')]) == {}
+        miss.discard()
+        await asyncio.sleep(0)
+        assert miss.task.cancelled()
+
+        # Not a search at all: nothing is started
+        assert agent._start_speculative_search([{"role": "user", "content": "hello"}]) is None
+
+    asyncio.run(scenario())
+    assert stats.stats() == {"started": 2, "hits": 1, "wasted": 1, "hit_rate": 0.5}
+    assert searches == ["Search the  weather"]
+
+
+def test_discarded_speculation_that_fails_is_not_reported_as_unhandled(monkeypatch):
+    loop_module = _load_loop_module(monkeypatch)
+    reported = []
+
+    async def failing_search():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            # Cleanup fails while the prefetch is being cancelled
+            raise RuntimeError("search backend down")
+
+    async def already_failed():
+        raise RuntimeError("search backend down")
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: reported.append(context["message"]))
+        speculations = [
+            loop_module.SpeculativeSearch("weather", asyncio.create_task(failing_search())),
+            loop_module.SpeculativeSearch("weather", asyncio.create_task(already_failed())),
+        ]
+        await asyncio.sleep(0)
+        for speculation in speculations:
+            speculation.discard()
+        await asyncio.sleep(0)
+        assert all(speculation.task.done() for speculation in speculations)
+        del speculations
+        gc.collect()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert reported == []
+    assert loop_module.speculation_stats.wasted == 2
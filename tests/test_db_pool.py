@@ -0,0 +1,45 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+
+def _load_pool_module():
+    spec = importlib.util.spec_from_file_location(
+        "pool_under_test", Path("backend/db/pool.py")
+    )
+    pool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pool)
+    return pool
+
+
+class FakeConnection:
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_pool_records_waits_timeouts_and_holders():
+    pool_module = _load_pool_module()
+    metrics = pool_module.pool_metrics
+    metrics.slow_checkout_seconds = 0.05
+    pool = pool_module.InstrumentedAsyncPool(FakeConnection, pool_size=1, max_overflow=0, timeout=0.1)
+
+    async def scenario():
+        held = await greenlet_spawn(pool.connect)
+        assert len(metrics.holders()) == 1
+        with pytest.raises(exc.TimeoutError):
+            await greenlet_spawn(pool.connect)
+        await greenlet_spawn(held.close)
+        assert metrics.holders() == []
+
+    asyncio.run(scenario())
+    stats = metrics.stats(pool)
+    assert stats["checkouts"] == 1 and stats["timeouts"] == 1
+    assert stats["wait_histogram"]["le_1ms"] == 1
+    assert stats["checked_out"] == 0 and stats["size"] == 1
@@ -0,0 +1,39 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+
+def _load_deadline_module():
+    spec = importlib.util.spec_from_file_location(
+        "deadline_under_test", Path("backend/deadline.py")
+    )
+    deadline = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(deadline)
+    return deadline
+
+
+def test_deadline_cancels_in_flight_await():
+    deadline_module = _load_deadline_module()
+    cancelled = []
+
+    async def stuck_upstream():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        deadline = deadline_module.Deadline(0.05)
+        assert await deadline.run(asyncio.sleep(0, result="fast")) == "fast"
+        with pytest.raises(deadline_module.RunTimeout):
+            await deadline.run(stuck_upstream())
+        assert deadline.expired
+        # Once expired, further calls fail without starting
+        with pytest.raises(deadline_module.RunTimeout):
+            await deadline.run(stuck_upstream())
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
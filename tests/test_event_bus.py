@@ -0,0 +1,64 @@
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, Path(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_postgres_bus_mirrors_chunked_events_between_processes(monkeypatch):
+    monkeypatch.setitem(sys.modules, "backend.config", types.SimpleNamespace(get_settings=lambda: types.SimpleNamespace()))
+    monkeypatch.setitem(
+        sys.modules, "backend.db.models",
+        types.SimpleNamespace(User=object, Thread=object, Message=object, Run=object),
+    )
+    event_bus = _load("event_bus_under_test", "backend/api/event_bus.py")
+    utils = _load("utils_under_test", "backend/api/utils.py")
+
+    sender = event_bus.PostgresEventBus("postgresql://unused")
+    receiver = event_bus.PostgresEventBus("postgresql://unused")
+    local, remote = utils.RunManager(), utils.RunManager()
+    local.bus = sender
+    receiver.run_manager = remote
+
+    local.create_run_data("run1", "thread", "hi", status="queued")
+    local.add_event("run1", "token", "x" * 20000)
+    local.update_status("run1", "completed")
+
+    notifications = []
+    while not sender._outbox.empty():
+        notifications.append(sender._outbox.get_nowait())
+    assert all(len(n.encode()) < 8000 for n in notifications)
+    assert sender.chunked == 1
+
+    # A process ignores its own notifications
+    sender._on_notification(None, 0, "run_events", notifications[0])
+    for notification in notifications:
+        receiver._on_notification(None, 0, "run_events", notification)
+
+    mirrored = remote.get_run_data("run1")
+    assert mirrored["status"] == "completed"
+    assert mirrored["events"][0]["data"] == "x" * 20000
+    assert receiver.received == 3
+
+
+def test_postgres_bus_drops_messages_once_the_outbox_is_full(monkeypatch):
+    monkeypatch.setitem(sys.modules, "backend.config", types.SimpleNamespace(get_settings=lambda: types.SimpleNamespace()))
+    event_bus = _load("event_bus_under_test", "backend/api/event_bus.py")
+
+    bus = event_bus.PostgresEventBus("postgresql://unused", max_outbox=4)
+    for i in range(3):
+        bus.publish({"kind": "status", "run_id": f"run{i}", "status": "running"})
+    # Two chunks no longer fit, so neither is queued
+    bus.publish({"kind": "event", "run_id": "run0", "event": {"data": "x" * 10000}})
+    bus.publish({"kind": "status", "run_id": "run3", "status": "running"})
+    bus.publish({"kind": "status", "run_id": "run4", "status": "running"})
+
+    stats = bus.stats()
+    assert stats["outbox"] == 4
+    assert stats["published"] == 4 and stats["outbox_dropped"] == 2
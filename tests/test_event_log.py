@@ -0,0 +1,77 @@
+import asyncio
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+from sqlalchemy import Column, DateTime, Integer, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import declarative_base
+
+
+def _load_event_log_module(monkeypatch):
+    Base = declarative_base()
+
+    class RunEventRecord(Base):
+        __tablename__ = "run_events"
+        run_id = Column(UUID(as_uuid=True), primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        event_type = Column(Text)
+        data = Column(JSONB)
+        created_at = Column(DateTime(timezone=True))
+
+    monkeypatch.setitem(
+        sys.modules, "backend.db.models",
+        types.SimpleNamespace(AsyncSessionLocal=None, RunEventRecord=RunEventRecord),
+    )
+    spec = importlib.util.spec_from_file_location(
+        "event_log_under_test", Path("backend/api/event_log.py")
+    )
+    event_log = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(event_log)
+    return event_log
+
+
+def test_writer_batches_by_size_and_interval(monkeypatch):
+    event_log = _load_event_log_module(monkeypatch)
+    inserts = []
+
+    class FakeSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def execute(self, statement):
+            inserts.append(len(statement.compile().params) // 5)
+
+        async def commit(self):
+            pass
+
+    async def scenario():
+        writer = event_log.RunEventWriter(batch_size=3, flush_interval=0.05, session_factory=FakeSession)
+        await writer.start()
+        event = {"event": "token", "data": "a", "timestamp": "2024-01-01T00:00:00"}
+        run_id = "00000000-0000-0000-0000-000000000001"
+
+        # A full batch is written straight away, as one multi-row insert
+        for seq in range(3):
+            writer.append(run_id, seq, event)
+        await asyncio.sleep(0.01)
+        assert inserts == [3]
+
+        # A partial batch waits for the flush interval
+        writer.append(run_id, 3, event)
+        await asyncio.sleep(0.01)
+        assert inserts == [3]
+        await asyncio.sleep(0.1)
+        assert inserts == [3, 1]
+
+        # Stopping writes what is left
+        writer.append(run_id, 4, event)
+        await writer.stop()
+        assert inserts == [3, 1, 1]
+        assert writer.stats()["written"] == 5
+
+    asyncio.run(scenario())
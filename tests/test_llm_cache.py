@@ -0,0 +1,55 @@
+import asyncio
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+
+def _load_llm_cache_module():
+    sys.modules["backend.config"] = types.SimpleNamespace(
+        get_settings=lambda: types.SimpleNamespace(LLM_CACHE_ENABLED=False)
+    )
+    spec = importlib.util.spec_from_file_location(
+        "llm_cache_under_test", Path("backend/llm_cache.py")
+    )
+    llm_cache = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(llm_cache)
+    return llm_cache
+
+
+def test_llm_cache_memory_and_disk_hits(tmp_path):
+    llm_cache = _load_llm_cache_module()
+    messages = [{"role": "user", "content": "hello"}]
+    key = llm_cache.LLMResponseCache.make_key("model", messages, "[]")
+    assert key == llm_cache.LLMResponseCache.make_key("model", [dict(messages[0])], "[]")
+    assert key != llm_cache.LLMResponseCache.make_key("other", messages, "[]")
+
+    async def scenario():
+        cache = llm_cache.LLMResponseCache(str(tmp_path), ttl_seconds=60)
+        assert await cache.get(key) is None
+        await cache.put(key, {"content": "hi", "tool_calls": [], "usage": {"total_tokens": 5}}, 0.5)
+        assert await cache.get(key) == {"content": "hi", "tool_calls": []}
+
+        # A fresh instance finds the entry on disk
+        reloaded = llm_cache.LLMResponseCache(str(tmp_path), ttl_seconds=60)
+        assert (await reloaded.get(key))["content"] == "hi"
+        return cache.stats(), reloaded.stats()
+
+    memory_stats, disk_stats = asyncio.run(scenario())
+    assert memory_stats["memory_hits"] == 1 and memory_stats["misses"] == 1
+    assert disk_stats["disk_hits"] == 1
+    assert disk_stats["saved_latency_seconds"] == 0.5
+
+
+def test_llm_cache_expires_entries(tmp_path):
+    llm_cache = _load_llm_cache_module()
+
+    async def scenario():
+        cache = llm_cache.LLMResponseCache(str(tmp_path), ttl_seconds=0)
+        await cache.put("k", {"content": "stale", "tool_calls": []}, 0.1)
+        return await cache.get("k"), cache.stats()
+
+    entry, stats = asyncio.run(scenario())
+    assert entry is None
+    assert stats["expired"] >= 1
+    assert not list(tmp_path.glob("*/*.json"))
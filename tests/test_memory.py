@@ -0,0 +1,117 @@
+import importlib.util
+import uuid
+from pathlib import Path
+
+
+def _load_memory_module():
+    spec = importlib.util.spec_from_file_location(
+        "memory_under_test", Path("backend/agent/memory.py")
+    )
+    memory = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(memory)
+    return memory
+
+
+def test_conversation_cache_hits_and_appends():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache(max_threads=2, max_messages=3)
+
+    assert cache.get("t1") is None
+    cache.begin_load("t1")
+    cache.finish_load("t1", [{"role": "user", "content": "hi", "token_count": 1}])
+    cache.append("t1", "assistant", "hello", token_count=2)
+
+    assert cache.get("t1") == [
+        {"role": "user", "content": "hi", "token_count": 1},
+        {"role": "assistant", "content": "hello", "token_count": 2},
+    ]
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_conversation_cache_discards_load_raced_by_write():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache()
+
+    cache.begin_load("t1")
+    cache.append("t1", "user", "written during load")
+    cache.finish_load("t1", [])
+    assert cache.get("t1") is None
+
+    # A failed load caches nothing either
+    cache.begin_load("t2")
+    cache.finish_load("t2", None)
+    assert cache.get("t2") is None
+
+
+def test_conversation_cache_evicts_least_recently_used():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache(max_threads=2)
+
+    for thread_id in ("a", "b", "c"):
+        cache.begin_load(thread_id)
+        cache.finish_load(thread_id, [])
+
+    assert cache.get("a") is None
+    assert cache.get("c") == []
+    assert cache.stats()["evictions"] == 1
+
+
+def test_build_context_fills_token_budget_newest_first():
+    spec = importlib.util.spec_from_file_location(
+        "context_under_test", Path("backend/agent/context.py")
+    )
+    context = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(context)
+    overhead = context.MESSAGE_OVERHEAD_TOKENS
+
+    history = [
+        {"role": "user", "content": "old", "token_count": 500},
+        {"role": "assistant", "content": "mid", "token_count": 10},
+        {"role": "user", "content": "new", "token_count": 10},
+    ]
+    selected = context.build_context(history, token_budget=2 * (10 + overhead))
+    assert [m["content"] for m in selected] == ["mid", "new"]
+    assert "token_count" not in selected[0]
+
+    # The newest message is kept even when it alone exceeds the budget
+    assert [m["content"] for m in context.build_context(history[:1], 1)] == ["old"]
+    # Messages without a stored count fall back to counting
+    counted = context.message_tokens({"role": "user", "content": "abcd"})
+    assert counted == context.count_tokens("abcd") + overhead
+
+
+def test_conversation_cache_keeps_summary_with_history():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache()
+
+    cache.begin_load("t1")
+    cache.finish_load("t1", [{"role": "user", "content": "recent", "token_count": 1}], summary="older turns")
+    assert cache.get_summary("t1") == "older turns"
+    assert cache.get("t1") == [{"role": "user", "content": "recent", "token_count": 1}]
+
+    cache.invalidate("t1")
+    assert cache.get_summary("t1") is None
+
+
+def test_disabled_conversation_cache_always_misses():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache(enabled=False)
+
+    cache.begin_load("t1")
+    cache.finish_load("t1", [{"role": "user", "content": "hello", "token_count": 1}])
+    cache.append("t1", "assistant", "hi", 1)
+    assert cache.get("t1") is None
+    assert cache.stats()["threads"] == 0 and cache.stats()["misses"] == 1
+
+
+def test_conversation_cache_normalizes_thread_ids():
+    memory = _load_memory_module()
+    cache = memory.ConversationCache()
+    thread_id = uuid.uuid4()
+
+    cache.begin_load(thread_id)
+    cache.finish_load(thread_id, [{"role": "user", "content": "hello", "token_count": 1}])
+    # The API hands over the id as written in the request path
+    cache.append(str(thread_id).upper(), "assistant", "hi", 1)
+    assert [m["content"] for m in cache.get(str(thread_id))] == ["hello", "hi"]
@@ -0,0 +1,124 @@
+import asyncio
+import importlib.util
+import sys
+import types
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import DateTime, Integer, String, Text, Uuid
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Run(Base):
+    __tablename__ = "runs"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    thread_id: Mapped[uuid.UUID] = mapped_column(Uuid)
+    status: Mapped[str] = mapped_column(String)
+    result: Mapped[str] = mapped_column(Text, nullable=True)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=True)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=True)
+    tokens_used: Mapped[int] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class Message(Base):
+    __tablename__ = "messages"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    thread_id: Mapped[uuid.UUID] = mapped_column(Uuid)
+    role: Mapped[str] = mapped_column(String)
+    content: Mapped[str] = mapped_column(Text)
+    token_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class FakeSession:
+    """Records what each commit would have written"""
+
+    def __init__(self, run, fail_commit=False):
+        self.run = run
+        self.fail_commit = fail_commit
+        self.pending = []
+        self.commits = []
+        self.rollbacks = 0
+
+    async def scalar(self, statement):
+        return self.run
+
+    def add(self, instance):
+        self.pending.append(instance)
+
+    async def commit(self):
+        if self.fail_commit:
+            raise RuntimeError("connection lost")
+        self.commits.append((self.pending, self.run.status, self.run.tokens_used))
+        self.pending = []
+
+    async def rollback(self):
+        self.rollbacks += 1
+        self.pending = []
+
+    async def close(self):
+        pass
+
+
+def _load_persistence_module(monkeypatch, cache_calls):
+    conversation_cache = types.SimpleNamespace(
+        invalidate=lambda thread_id: cache_calls.append(("invalidate", thread_id)),
+        append=lambda thread_id, role, content, token_count: cache_calls.append(("append", thread_id, content)),
+    )
+    monkeypatch.setitem(sys.modules, "backend.db", types.SimpleNamespace(AsyncSessionLocal=None))
+    monkeypatch.setitem(sys.modules, "backend.db.models", types.SimpleNamespace(Message=Message, Run=Run))
+    monkeypatch.setitem(sys.modules, "backend.agent.memory", types.SimpleNamespace(conversation_cache=conversation_cache))
+    monkeypatch.setitem(sys.modules, "backend.agent.summary", types.SimpleNamespace(get_summarizer=lambda: None))
+    spec = importlib.util.spec_from_file_location(
+        "persistence_under_test", Path("backend/agent/persistence.py")
+    )
+    persistence = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(persistence)
+    return persistence
+
+
+def _run():
+    return Run(id=uuid.uuid4(), thread_id=uuid.uuid4(), status="running")
+
+
+def test_finish_commits_message_and_run_together(monkeypatch):
+    cache_calls = []
+    persistence = _load_persistence_module(monkeypatch, cache_calls)
+    run = _run()
+    session = FakeSession(run)
+
+    unit = persistence.RunUnitOfWork(run.id, session_factory=lambda: session)
+    usage = {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}
+    message = asyncio.run(unit.finish("completed", result="answer", usage=usage, assistant_content="answer"))
+
+    assert len(session.commits) == 1
+    written, status, tokens_used = session.commits[0]
+    assert written == [message]
+    assert message.role == "assistant" and message.thread_id == run.thread_id
+    assert message.token_count == persistence.count_tokens("answer")
+    assert (status, tokens_used, run.result) == ("completed", 8, "answer")
+    assert cache_calls == [("append", run.thread_id, "answer")]
+
+
+def test_finish_rolls_back_and_invalidates_the_cache_when_the_commit_fails(monkeypatch):
+    cache_calls = []
+    persistence = _load_persistence_module(monkeypatch, cache_calls)
+    run = _run()
+    session = FakeSession(run, fail_commit=True)
+
+    unit = persistence.RunUnitOfWork(run.id, session_factory=lambda: session)
+    with pytest.raises(RuntimeError):
+        asyncio.run(unit.finish("completed", result="answer", assistant_content="answer"))
+
+    assert session.commits == [] and session.pending == []
+    assert session.rollbacks == 1
+    assert cache_calls == [("invalidate", run.thread_id)]
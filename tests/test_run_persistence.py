@@ -1,4 +1,6 @@
+import asyncio
 import importlib.util
+import json
 import sys
 import types
 from pathlib import Path
@@ -7,20 +9,34 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 
-def test_run_manager_retains_completed_events():
-    # stub minimal backend.db.models for utils import
-    sys.modules["backend.db.models"] = types.SimpleNamespace(
+def _load_utils(monkeypatch, **models):
+    """Load the API utils against stubbed database models"""
+    monkeypatch.setitem(sys.modules, "backend.db.models", types.SimpleNamespace(
         User=object,
         Thread=object,
         Message=object,
         Run=object,
-    )
-
+        **models,
+    ))
     spec = importlib.util.spec_from_file_location(
         "backend.api.utils", Path("backend/api/utils.py")
     )
     utils = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(utils)
+    return utils
+
+
+def _load_spill():
+    spec = importlib.util.spec_from_file_location(
+        "event_spill_under_test", Path("backend/api/event_spill.py")
+    )
+    event_spill = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(event_spill)
+    return event_spill
+
+
+def test_run_manager_retains_completed_events(monkeypatch):
+    utils = _load_utils(monkeypatch)
 
     manager = utils.RunManager(retention_seconds=60)
     run_id = "run1"
@@ -30,38 +46,244 @@ def test_run_manager_retains_completed_events():
 
     data = manager.get_run_data(run_id)
     assert data["status"] == "completed"
-    events = manager.get_events_since(run_id, 0)
+    events = asyncio.run(manager.get_events_since(run_id, 0))
     assert events and events[0]["data"] == "hello"
 
 
-def test_logs_endpoint_returns_events():
+def test_run_manager_expires_completed_runs_by_deadline(monkeypatch):
+    utils = _load_utils(monkeypatch)
+
+    # Without a loop, lookups drain due deadlines
+    manager = utils.RunManager(retention_seconds=0)
+    manager.create_run_data("run1", "thread", "msg")
+    manager.update_status("run1", "completed")
+    assert manager.get_run_data("run1") is None
+    assert manager.stats()["expired_runs"] == 1
+
+    # With a loop, the background reaper removes runs without any lookup
+    async def scenario():
+        manager = utils.RunManager(retention_seconds=0.05)
+        manager.create_run_data("run2", "thread", "msg")
+        manager.update_status("run2", "completed")
+        assert "run2" in manager.completed_runs
+        await asyncio.sleep(0.1)
+        assert "run2" not in manager.completed_runs
+        assert manager.stats()["expiry_queue"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_run_manager_keeps_subscribed_runs_and_numbers_events(monkeypatch):
+    utils = _load_utils(monkeypatch)
+
+    manager = utils.RunManager(retention_seconds=0)
+    manager.create_run_data("run1", "thread", "msg")
+    for data in ("a", "b", "c"):
+        manager.add_event("run1", "token", data)
+    assert [event["id"] for event in asyncio.run(manager.get_events_since("run1", 0))] == [0, 1, 2]
+    # Resuming after id 1 only returns what came later
+    assert [event["data"] for event in asyncio.run(manager.get_events_since("run1", 2))] == ["c"]
+
+    manager.subscribe("run1")
+    manager.subscribe("run1")
+    manager.update_status("run1", "completed")
+    assert manager.get_run_data("run1") is not None
+
+    # Data outlives the first stream to leave, and expires after the last one
+    manager.unsubscribe("run1")
+    assert manager.get_run_data("run1") is not None
+    manager.unsubscribe("run1")
+    assert manager.get_run_data("run1") is None
+
+
+def test_run_manager_wakes_subscribers_on_change_and_heartbeat(monkeypatch):
+    utils = _load_utils(monkeypatch)
+
+    async def scenario():
+        manager = utils.RunManager(heartbeat_seconds=0.05)
+        manager.create_run_data("run1", "thread", "msg")
+
+        waiter = manager.waiter("run1")
+        manager.add_event("run1", "token", "hello")
+        assert waiter.done() and waiter.result() is False
+
+        # Nothing happens: the shared ticker wakes the subscriber with a heartbeat
+        assert await asyncio.wait_for(manager.wait("run1"), 1) is True
+
+        waiter = manager.waiter("run1")
+        manager.update_status("run1", "completed")
+        assert await waiter is False
+        assert manager.stats()["subscribers_waiting"] == 0
+        manager._ticker.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_run_manager_spills_events_past_buffer_limits(tmp_path, monkeypatch):
+    utils = _load_utils(monkeypatch)
+    event_spill = _load_spill()
+
+    async def scenario():
+        manager = utils.RunManager(max_events_per_run=8, max_buffer_bytes=4000)
+        manager.spill = event_spill.FileEventSpill(str(tmp_path))
+        manager.create_run_data("run1", "thread", "msg")
+        for i in range(20):
+            manager.add_event("run1", "token", f"{i}:" + "x" * 100)
+
+        stats = manager.stats()
+        assert stats["buffered_events"] <= 8
+        assert stats["evicted_events"] == 20 - stats["buffered_events"]
+        assert stats["dropped_events"] == 0
+
+        # Evicted events come back in order, whether or not the writer got to them yet
+        events = await manager.get_events_since("run1", 3)
+        assert [event["data"].split(":")[0] for event in events] == [str(i) for i in range(3, 20)]
+        await asyncio.sleep(0.05)
+        assert manager.spill.stats()["pending_events"] == 0
+        assert manager.spill.stats()["spilled_events"] == stats["evicted_events"]
+        events = await manager.get_events_since("run1", 3)
+        assert [event["data"].split(":")[0] for event in events] == [str(i) for i in range(3, 20)]
+        assert manager.event_count("run1") == 20
+
+        # A second run pushes the total over the byte budget
+        manager.create_run_data("run2", "thread", "msg")
+        for i in range(6):
+            manager.add_event("run2", "tool", "y" * 600)
+        assert manager.stats()["buffered_bytes"] <= 4000
+
+        manager.cleanup_run("run1")
+        await asyncio.sleep(0.05)
+        assert not list(tmp_path.rglob("run1*"))
+        await manager.spill.stop()
+
+    asyncio.run(scenario())
+
+
+def test_file_event_spill_seeks_by_id_and_clears_stale_files(tmp_path):
+    event_spill = _load_spill()
+
+    # Left behind by an older layout and by a process that is gone
+    (tmp_path / "old-run.jsonl").write_text("{}\n")
+    (tmp_path / "999999999").mkdir()
+    (tmp_path / "999999999" / "run-0.jsonl").write_text("{}\n")
+
+    async def scenario():
+        spill = event_spill.FileEventSpill(str(tmp_path))
+        assert [path.name for path in tmp_path.iterdir()] == [spill.directory.name]
+        spill.append("run", [{"id": seq, "data": "é" * seq} for seq in range(5)])
+        spill.append("run", [{"id": seq, "data": "é" * seq} for seq in range(7, 10)])
+        await asyncio.sleep(0.05)
+        assert [event["id"] for event in await spill.read("run", 3, 9)] == [3, 4, 7, 8]
+        assert await spill.read("run", 5, 7) == []
+        assert await spill.read("other", 0, 10) == []
+        spill.delete("run")
+        await asyncio.sleep(0.05)
+        assert not list(spill.directory.iterdir())
+        await spill.stop()
+
+    asyncio.run(scenario())
+
+
+def test_run_manager_reads_spilled_events_by_id(tmp_path, monkeypatch):
+    utils = _load_utils(monkeypatch)
+    event_spill = _load_spill()
+
+    manager = utils.RunManager(max_events_per_run=8)
+    manager.spill = event_spill.FileEventSpill(str(tmp_path))
+
+    # A run mirrored from another process whose events are numbered from 50
+    for seq in range(50, 70):
+        manager.apply_remote({
+            "kind": "event",
+            "run_id": "mirrored",
+            "event": {"id": seq, "event": "token", "data": str(seq), "timestamp": "t"},
+        })
+    assert manager.get_run_data("mirrored")["first_index"] > 52
+    assert [event["id"] for event in asyncio.run(manager.get_events_since("mirrored", 52))] == list(range(52, 70))
+
+    # The first eviction fails to spill; later ones still read back under their own ids
+    append = manager.spill.append
+    failures = [True]
+    manager.spill.append = lambda run_id, events: False if failures and failures.pop() else append(run_id, events)
+    manager.create_run_data("local", "thread", "msg")
+    for i in range(20):
+        manager.add_event("local", "token", str(i))
+    lost = manager.stats()["dropped_events"]
+    assert lost > 0
+    events = asyncio.run(manager.get_events_since("local", 0))
+    assert [event["id"] for event in events] == list(range(lost, 20))
+    assert [event["data"] for event in events] == [str(i) for i in range(lost, 20)]
+
+
+def test_run_manager_keeps_ids_aligned_across_mirrored_gaps(tmp_path, monkeypatch):
+    utils = _load_utils(monkeypatch)
+    event_spill = _load_spill()
+
+    manager = utils.RunManager()
+    manager.spill = event_spill.FileEventSpill(str(tmp_path))
+    # Event 3 never arrived from the origin process
+    for seq in (0, 1, 2, 4, 5, 6):
+        manager.apply_remote({
+            "kind": "event",
+            "run_id": "r",
+            "event": {"id": seq, "event": "token", "data": str(seq), "timestamp": "t"},
+        })
+
+    assert [event["id"] for event in asyncio.run(manager.get_events_since("r", 5))] == [5, 6]
+    assert [event["id"] for event in asyncio.run(manager.get_events_since("r", 0))] == [0, 1, 2, 4, 5, 6]
+    assert [frame.split(b"\n")[0] for frame in asyncio.run(manager.get_frames_since("r", 4))] == [b"id: 4", b"id: 5", b"id: 6"]
+    assert manager.event_count("r") == 7
+
+
+def test_run_manager_encodes_each_event_once(monkeypatch):
+    utils = _load_utils(monkeypatch)
+
+    manager = utils.RunManager()
+    manager.create_run_data("run1", "thread", "msg")
+    manager.add_event("run1", "tool", {"name": "search", "results": ["é", 1]})
+
+    # Every subscriber gets the very same buffer
+    first = asyncio.run(manager.get_frames_since("run1", 0))[0]
+    assert asyncio.run(manager.get_frames_since("run1", 0))[0] is first
+    assert first.startswith(b"id: 0\nevent: tool\ndata: ")
+    payload = json.loads(first.split(b"data: ", 1)[1])
+    assert payload == {"type": "tool", "data": {"name": "search", "results": ["é", 1]}}
+
+    # The stdlib fallback produces the same frame
+    utils.orjson = None
+    assert utils.event_frame(asyncio.run(manager.get_events_since("run1", 0))[0]) == first
+
+
+def test_logs_endpoint_returns_events(monkeypatch):
     # stub configuration and dependent modules before importing routes
-    def dummy_get_db():
+    async def dummy_get_db():
         yield None
 
-    sys.modules["backend.config"] = types.SimpleNamespace(
+    monkeypatch.setitem(sys.modules, "backend.config", types.SimpleNamespace(
         get_settings=lambda: types.SimpleNamespace()
-    )
-    sys.modules["backend.db.models"] = types.SimpleNamespace(
-        User=object,
-        Thread=object,
-        Message=object,
-        Run=object,
-        get_db=dummy_get_db,
-        SessionLocal=None,
+    ))
+    utils = _load_utils(
+        monkeypatch,
+        get_async_db=dummy_get_db,
+        get_pool_stats=lambda: {},
+        AsyncSessionLocal=None,
+        RunEventRecord=object,
     )
 
-    spec_utils = importlib.util.spec_from_file_location(
-        "backend.api.utils", Path("backend/api/utils.py")
-    )
-    utils = importlib.util.module_from_spec(spec_utils)
-    spec_utils.loader.exec_module(utils)
-
     # stub out DB lookup
-    utils.get_run_by_id = lambda db, rid: types.SimpleNamespace(id=rid)
-    sys.modules["backend.api.utils"] = utils
+    async def get_run_by_id(db, rid):
+        return types.SimpleNamespace(id=rid)
 
-    sys.modules["backend.agent"] = types.SimpleNamespace(AgentLoop=object)
+    utils.get_run_by_id = get_run_by_id
+    monkeypatch.setitem(sys.modules, "backend.api.utils", utils)
+    monkeypatch.setitem(sys.modules, "backend.agent", types.SimpleNamespace(
+        AgentLoop=object,
+        RunUnitOfWork=object,
+        conversation_cache=None,
+        get_summarizer=lambda: None,
+        speculation_stats=None,
+        tool_results=None,
+    ))
 
     spec_routes = importlib.util.spec_from_file_location(
         "backend.api.routes", Path("backend/api/routes.py")
@@ -83,4 +305,17 @@ def test_logs_endpoint_returns_events():
     assert resp.status_code == 200
     body = resp.json()
     assert body["run_id"] == run_id
-    assert body["events"][0]["data"] == "hello"
\ No newline at end of file
+    assert body["events"][0]["data"] == "hello"
+
+    # Once early events have left memory the log supplies them, and memory the unwritten tail
+    async def load_run_events(db, rid):
+        return [{"id": seq, "event": "token", "data": str(seq), "timestamp": "t"} for seq in range(12)]
+
+    routes.load_run_events = load_run_events
+    rm.max_events_per_run = 8
+    rm.create_run_data("evicted", "thread", "hi")
+    for seq in range(15):
+        rm.add_event("evicted", "token", str(seq))
+    assert rm.get_run_data("evicted")["first_index"] > 0
+    body = client.get("/runs/evicted/logs").json()
+    assert [event["data"] for event in body["events"]] == [str(seq) for seq in range(15)]
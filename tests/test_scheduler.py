@@ -0,0 +1,119 @@
+import asyncio
+import importlib.util
+import sys
+import types
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import DateTime, String, Uuid
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Run(Base):
+    __tablename__ = "runs"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    status: Mapped[str] = mapped_column(String)
+    result: Mapped[str] = mapped_column(String)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+def _load_scheduler_module(monkeypatch, events):
+    run_manager = types.SimpleNamespace(
+        add_event=lambda run_id, event_type, data: events.append((run_id, event_type, data)),
+        update_status=lambda run_id, status: events.append((run_id, "status", status)),
+    )
+    monkeypatch.setitem(sys.modules, "backend.config", types.SimpleNamespace(get_settings=lambda: types.SimpleNamespace()))
+    monkeypatch.setitem(sys.modules, "backend.db.models", types.SimpleNamespace(AsyncSessionLocal=None, Run=Run))
+    monkeypatch.setitem(sys.modules, "backend.api.utils", types.SimpleNamespace(run_manager=run_manager))
+    spec = importlib.util.spec_from_file_location(
+        "backend.api.scheduler", Path("backend/api/scheduler.py")
+    )
+    scheduler = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(scheduler)
+    return scheduler
+
+
+def test_scheduler_limits_concurrency_and_reports_positions(monkeypatch):
+    events = []
+    scheduler_module = _load_scheduler_module(monkeypatch, events)
+
+    async def scenario():
+        scheduler = scheduler_module.RunScheduler(max_concurrent=1, max_queue=2)
+        release = asyncio.Event()
+        active = []
+        peak = []
+
+        async def job():
+            active.append(1)
+            peak.append(len(active))
+            await release.wait()
+            active.pop()
+
+        positions = []
+        for run_id in ("a", "b", "c"):
+            scheduler.reserve()
+            positions.append(scheduler.submit(run_id, job))
+        assert positions == [0, 1, 2]
+
+        # Queue is full: the next run is refused with a retry hint
+        with pytest.raises(scheduler_module.QueueFull) as refused:
+            scheduler.reserve()
+        assert refused.value.retry_after >= 1
+
+        release.set()
+        while scheduler.stats()["finished"] < 3:
+            await asyncio.sleep(0.01)
+        return scheduler.stats(), max(peak)
+
+    stats, peak = asyncio.run(scenario())
+    assert peak == 1
+    assert stats["rejected"] == 1 and stats["running"] == 0 and stats["queued"] == 0
+    # "c" moved up to position 1 once "a" finished
+    assert ("c", "queued", {"position": 1}) in events
+
+
+def test_scheduler_shutdown_records_interrupted_runs_as_errors(monkeypatch):
+    events = []
+    scheduler_module = _load_scheduler_module(monkeypatch, events)
+    statements = []
+
+    class FakeSession:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def execute(self, statement):
+            statements.append(statement.compile().params)
+
+        async def commit(self):
+            statements.append("commit")
+
+    running_id, queued_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def scenario():
+        scheduler = scheduler_module.RunScheduler(max_concurrent=1, max_queue=1, session_factory=FakeSession)
+        for run_id in (running_id, queued_id):
+            scheduler.reserve()
+            scheduler.submit(run_id, lambda: asyncio.sleep(10))
+        await asyncio.sleep(0)
+        await scheduler.shutdown()
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["running"] == 0 and stats["queued"] == 0
+    for run_id in (running_id, queued_id):
+        assert (run_id, "error", {"error": scheduler_module.SHUTDOWN_ERROR}) in events
+        assert (run_id, "status", "error") in events
+    params, commit = statements
+    assert commit == "commit"
+    assert params["status"] == "error" and params["result"] == scheduler_module.SHUTDOWN_ERROR
+    assert {str(run_id) for run_id in params["id_1"]} == {running_id, queued_id}
@@ -0,0 +1,143 @@
+import asyncio
+import importlib.util
+import sys
+import types
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import DateTime, Text, Uuid
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Thread(Base):
+    __tablename__ = "threads"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    summary: Mapped[str] = mapped_column(Text)
+    summarized_until: Mapped[datetime] = mapped_column(DateTime)
+
+
+def _load_summary_module(monkeypatch, invalidated):
+    settings = types.SimpleNamespace(OPENAI_API_KEY=None)
+    conversation_cache = types.SimpleNamespace(invalidate=invalidated.append)
+    monkeypatch.setitem(sys.modules, "backend.config", types.SimpleNamespace(get_settings=lambda: settings))
+    monkeypatch.setitem(sys.modules, "backend.http_clients", types.SimpleNamespace(http_clients=None))
+    monkeypatch.setitem(sys.modules, "backend.db", types.SimpleNamespace(AsyncSessionLocal=None))
+    monkeypatch.setitem(sys.modules, "backend.db.models", types.SimpleNamespace(Thread=Thread, Message=None))
+    monkeypatch.setitem(sys.modules, "backend.agent.memory", types.SimpleNamespace(conversation_cache=conversation_cache))
+    spec = importlib.util.spec_from_file_location(
+        "summary_under_test", Path("backend/agent/summary.py")
+    )
+    summary = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(summary)
+    return summary
+
+
+def _messages(count, start=datetime(2024, 1, 1)):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}", "created_at": start + timedelta(minutes=i)}
+        for i in range(count)
+    ]
+
+
+def test_select_aged_out_waits_for_a_full_batch(monkeypatch):
+    summary = _load_summary_module(monkeypatch, [])
+    messages = _messages(30)
+
+    assert summary.select_aged_out(messages[:29], keep_recent=20, min_batch=10) == []
+    assert summary.select_aged_out(messages, keep_recent=20, min_batch=10) == messages[:10]
+    assert summary.select_aged_out(messages[:5], keep_recent=20, min_batch=0) == []
+
+
+def test_extractive_summary_drops_oldest_lines_past_the_budget(monkeypatch):
+    summary = _load_summary_module(monkeypatch, [])
+    messages = [{"role": "user", "content": "word " * 100}, {"role": "assistant", "content": "latest answer"}]
+
+    result = summary.extractive_summary("older summary line", messages, max_tokens=20)
+    assert summary.count_tokens(result) <= 20
+    assert result.splitlines()[-1] == "assistant: latest answer"
+    assert "older summary line" not in result
+
+    # Long messages are cut to an excerpt, and a lone line is kept even over budget
+    result = summary.extractive_summary(None, messages[:1], max_tokens=1)
+    assert result == f"user: {'word ' * 100}"[:summary.EXCERPT_CHARS]
+
+
+def test_store_only_moves_the_watermark_it_was_built_from(monkeypatch):
+    summary = _load_summary_module(monkeypatch, [])
+    statements = []
+
+    class FakeSession:
+        rowcount = 1
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def execute(self, statement):
+            statements.append(statement)
+            return types.SimpleNamespace(rowcount=FakeSession.rowcount)
+
+        async def commit(self):
+            pass
+
+    summary.AsyncSessionLocal = FakeSession
+    summarizer = summary.ConversationSummarizer()
+    thread_id = uuid.uuid4()
+    until = datetime(2024, 1, 1)
+
+    assert asyncio.run(summarizer._store(thread_id, "s", None, until))
+    assert "threads.summarized_until IS NULL" in str(statements[-1])
+
+    # Another compaction moved the watermark: no row matches and nothing is stored
+    FakeSession.rowcount = 0
+    assert not asyncio.run(summarizer._store(thread_id, "s", until, until + timedelta(minutes=1)))
+    where = str(statements[-1].whereclause)
+    assert "threads.summarized_until = :summarized_until_1" in where
+    assert statements[-1].compile().params["summarized_until_1"] == until
+
+
+def test_compaction_invalidates_cached_history_only_after_a_fold(monkeypatch):
+    invalidated = []
+    summary = _load_summary_module(monkeypatch, invalidated)
+    summarizer = summary.ConversationSummarizer(keep_recent=2, min_batch=3)
+    messages = _messages(15)
+    stored = []
+
+    async def load_pending(thread_id):
+        if not stored:
+            return None, None, messages
+        # After the fold only the recent window is left, too few for another batch
+        return stored[-1][0], stored[-1][1], messages[13:]
+
+    async def store(thread_id, new_summary, previous_until, summarized_until):
+        stored.append((new_summary, summarized_until))
+        return True
+
+    summarizer._load_pending = load_pending
+    summarizer._store = store
+    asyncio.run(summarizer._compact("thread"))
+
+    assert [until for _, until in stored] == [messages[12]["created_at"]]
+    assert invalidated == ["thread"]
+    assert summarizer.stats()["compactions"] == 1 and summarizer.stats()["messages_folded"] == 13
+
+    # Losing the compare-and-set leaves the cache alone
+    async def load_unfolded(thread_id):
+        return None, None, messages
+
+    async def store_conflict(*args):
+        return False
+
+    summarizer._load_pending = load_unfolded
+    summarizer._store = store_conflict
+    asyncio.run(summarizer._compact("thread"))
+    assert invalidated == ["thread"]
+    assert summarizer.stats()["conflicts"] == 1 and summarizer.stats()["running"] == 0
@@ -0,0 +1,43 @@
+import importlib.util
+import json
+from pathlib import Path
+
+
+def _load_tool_output_module():
+    spec = importlib.util.spec_from_file_location(
+        "tool_output_under_test", Path("backend/agent/tool_output.py")
+    )
+    tool_output = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool_output)
+    return tool_output
+
+
+def test_small_results_only_lose_redundant_fields():
+    tool_output = _load_tool_output_module()
+    data = {"query": "q", "results": [{"title": "t", "source": "x"}], "source": "coexistai"}
+    assert json.loads(tool_output.reduce_tool_output(data, 100)) == {"query": "q", "results": [{"title": "t"}]}
+
+
+def test_long_text_is_excerpted_around_the_query():
+    tool_output = _load_tool_output_module()
+    filler = " ".join(f"Sentence {i} talks about gardening and weather." for i in range(200))
+    text = f"Intro to the page. {filler} The capital of France is Paris. {filler}"
+    data = {"url": "http://example.com", "title": "Page", "text": text, "source": "runner"}
+
+    content = tool_output.reduce_tool_output(data, 200, "What is the capital of France?", result_id="call_1")
+    reduced = json.loads(content)
+    assert "source" not in reduced
+    assert reduced["truncated"] is True and reduced["result_id"] == "call_1"
+    assert reduced["text"].startswith("Intro to the page.")
+    assert "The capital of France is Paris." in reduced["text"]
+    assert len(content) < len(text) // 10
+
+
+def test_tool_result_store_keeps_full_results():
+    tool_output = _load_tool_output_module()
+    store = tool_output.ToolResultStore(max_entries=1)
+    store.put("a", {"data": 1})
+    store.put("b", {"data": 2})
+    assert store.get("a") is None and store.get("b") == {"data": 2}
+    store.record(100, 40)
+    assert store.stats()["tokens_saved"] == 60
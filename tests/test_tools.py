@@ -1,10 +1,11 @@
 import importlib.util
+import json
 import types
 import sys
 from pathlib import Path
 
 
-def test_get_default_tools_names():
+def _load_tools_module():
     # Provide a lightweight stub for backend.config to avoid reading the real
     # settings (which requires many environment variables).
     class DummySettings:
@@ -28,7 +29,25 @@ def test_get_default_tools_names():
     )
     tools_module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(tools_module)
+    return tools_module
+
+
+def test_get_default_tools_names():
+    tools_module = _load_tools_module()
 
     tool_names = {tool.name for tool in tools_module.get_default_tools()}
     assert "web_search" in tool_names
     assert "browser" in tool_names
+
+
+def test_tool_registry_lookup_and_schemas():
+    tools_module = _load_tools_module()
+
+    registry = tools_module.get_tool_registry()
+    assert tools_module.get_tool_registry() is registry
+    assert registry.get("web_search").name == "web_search"
+    assert registry.get("missing") is None
+    assert "browser" in registry
+
+    schema_names = [schema["function"]["name"] for schema in json.loads(registry.schemas_json)]
+    assert schema_names == [tool.name for tool in registry]